@@ -0,0 +1,253 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import Histogram, render_histogram, record_phase, PREFIX
+
+# ---------------------------------------------------------
+# Priorities
+# ---------------------------------------------------------
+INTERACTIVE = 0  # chat
+DASHBOARD = 1  # finance / discover page loads
+BACKGROUND = 2  # prewarm and refresh loops
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", DASHBOARD: "dashboard", BACKGROUND: "background"}
+
+# Set by each entry point; inherited by the tasks and threads it spawns.
+CURRENT_PRIORITY = contextvars.ContextVar("upstream_priority", default=DASHBOARD)
+
+# Background work may hold at most this share of an upstream's concurrency
+BACKGROUND_SHARE = float(os.environ.get("ADMISSION_BACKGROUND_SHARE", 0.5))
+# Queued background calls beyond this are dropped immediately
+BACKGROUND_MAX_QUEUE = int(os.environ.get("ADMISSION_BACKGROUND_MAX_QUEUE", 20))
+# Queued background calls waiting longer than this are dropped
+BACKGROUND_MAX_WAIT = float(os.environ.get("ADMISSION_BACKGROUND_MAX_WAIT", 30))
+
+WAIT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+# ---------------------------------------------------------
+# Limiter
+# ---------------------------------------------------------
+class UpstreamLimiter:
+    """
+    Token-bucket rate limit plus a concurrency cap for one upstream service.
+
+    Waiters are admitted strictly by priority (then arrival order). Background
+    callers are capped to a share of the concurrency, and are the only ones
+    that get dropped when the queue is deep or they have waited too long.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.background_limit = max(1, int(concurrency * BACKGROUND_SHARE))
+
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.active = 0
+        self.active_background = 0
+
+        self._queue = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._timer = None
+        self._loop = None  # the serving loop, bound on first async use
+
+        self.wait_times = {p: Histogram(WAIT_BUCKETS) for p in PRIORITY_NAMES}
+        self.queue_depth = {p: 0 for p in PRIORITY_NAMES}
+        self.peak_queue_depth = {p: 0 for p in PRIORITY_NAMES}
+        self.admitted = {p: 0 for p in PRIORITY_NAMES}
+        self.dropped = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _can_admit(self, priority: int) -> bool:
+        if self.active >= self.concurrency or self.tokens < 1:
+            return False
+        if priority == BACKGROUND and self.active_background >= self.background_limit:
+            return False
+        return True
+
+    def _admit(self, priority: int):
+        self.tokens -= 1
+        self.active += 1
+        if priority == BACKGROUND:
+            self.active_background += 1
+        self.admitted[priority] += 1
+
+    def _dispatch(self):
+        self._timer = None
+        self._refill()
+        while self._queue:
+            priority, _, future = self._queue[0]
+            if future.done():
+                # Gave up waiting; already removed from queue_depth
+                heapq.heappop(self._queue)
+                continue
+            if not self._can_admit(priority):
+                break
+            heapq.heappop(self._queue)
+            self.queue_depth[priority] -= 1
+            self._admit(priority)
+            future.set_result(None)
+
+        if self._queue and self.tokens < 1 and self._timer is None:
+            delay = (1 - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority: int = None):
+        if priority is None:
+            priority = CURRENT_PRIORITY.get()
+        self._loop = asyncio.get_running_loop()
+        self._refill()
+        if not self._queue and self._can_admit(priority):
+            self._admit(priority)
+            self.wait_times[priority].observe(0.0)
+            return
+
+        if priority == BACKGROUND and self.queue_depth[BACKGROUND] >= BACKGROUND_MAX_QUEUE:
+            self.dropped += 1
+            raise AdmissionRejected(f"{self.name}: background queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self.queue_depth[priority] += 1
+        self.peak_queue_depth[priority] = max(self.peak_queue_depth[priority], self.queue_depth[priority])
+        self._dispatch()
+
+        started = time.monotonic()
+        timeout = BACKGROUND_MAX_WAIT if priority == BACKGROUND else None
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as we gave up; hand the slot back
+                self.release(priority)
+            else:
+                future.cancel()
+                self.queue_depth[priority] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.dropped += 1
+                raise AdmissionRejected(f"{self.name}: background call waited too long") from None
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.wait_times[priority].observe(waited)
+            record_phase(f"{self.name}_queue", waited)
+
+    def release(self, priority: int):
+        self.active -= 1
+        if priority == BACKGROUND:
+            self.active_background -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = None):
+        if priority is None:
+            priority = CURRENT_PRIORITY.get()
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    @contextmanager
+    def sync_slot(self, priority: int = None):
+        """
+        `slot()` for blocking callers on worker threads: the wait runs on the
+        serving loop, so sync calls share the same queue and rate. Without a
+        serving loop (scripts, or called on the loop's own thread, where
+        blocking would deadlock it) there is nothing to arbitrate and the call
+        goes straight through.
+        """
+        if priority is None:
+            priority = CURRENT_PRIORITY.get()
+        loop = self._loop
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if loop is None or loop.is_closed() or on_loop:
+            yield
+            return
+        asyncio.run_coroutine_threadsafe(self.acquire(priority), loop).result()
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(self.release, priority)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "active_background": self.active_background,
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "tokens": round(self.tokens, 2),
+            "dropped": self.dropped,
+            "queue_depth": {PRIORITY_NAMES[p]: d for p, d in self.queue_depth.items()},
+            "peak_queue_depth": {PRIORITY_NAMES[p]: d for p, d in self.peak_queue_depth.items()},
+            "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+            "wait_seconds": {PRIORITY_NAMES[p]: h.snapshot() for p, h in self.wait_times.items()},
+        }
+
+
+def _limiter(name: str, rate: float, burst: int, concurrency: int) -> UpstreamLimiter:
+    prefix = name.upper()
+    return UpstreamLimiter(
+        name,
+        rate=float(os.environ.get(f"{prefix}_RATE_LIMIT", rate)),
+        burst=int(os.environ.get(f"{prefix}_BURST", burst)),
+        concurrency=int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency)),
+    )
+
+
+# Defaults follow the published per-minute quotas (Tavily production plan and
+# Gemini 2.5 Flash tier 1: 1000 requests/minute each); set *_RATE_LIMIT,
+# *_BURST and *_CONCURRENCY for other plans.
+LIMITERS = {
+    "tavily": _limiter("tavily", rate=1000 / 60, burst=50, concurrency=32),
+    "gemini": _limiter("gemini", rate=1000 / 60, burst=50, concurrency=64),
+}
+
+
+def set_priority(priority: int):
+    """Marks upstream calls made from the current context (and tasks it spawns)."""
+    return CURRENT_PRIORITY.set(priority)
+
+
+def stats():
+    return {name: limiter.stats() for name, limiter in LIMITERS.items()}
+
+
+def metric_lines():
+    """Prometheus lines for every limiter: queue waits, admissions, drops and load."""
+    wait = f"{PREFIX}_admission_wait_seconds"
+    lines = [f"# TYPE {wait} histogram"]
+    for name, limiter in LIMITERS.items():
+        for p, histogram in limiter.wait_times.items():
+            lines.extend(render_histogram(wait, ("upstream", "priority"), (name, PRIORITY_NAMES[p]), histogram))
+
+    lines.append(f"# TYPE {PREFIX}_admission_admitted_total counter")
+    for name, limiter in LIMITERS.items():
+        for p, count in limiter.admitted.items():
+            lines.append(f'{PREFIX}_admission_admitted_total{{upstream="{name}",priority="{PRIORITY_NAMES[p]}"}} {count}')
+    lines.append(f"# TYPE {PREFIX}_admission_dropped_total counter")
+    for name, limiter in LIMITERS.items():
+        lines.append(f'{PREFIX}_admission_dropped_total{{upstream="{name}"}} {limiter.dropped}')
+    lines.append(f"# TYPE {PREFIX}_admission_active gauge")
+    for name, limiter in LIMITERS.items():
+        lines.append(f'{PREFIX}_admission_active{{upstream="{name}"}} {limiter.active}')
+    return lines
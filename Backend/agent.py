@@ -1,17 +1,20 @@
-import os
-from typing import TypedDict, Annotated, List
+import asyncio
+import threading
+from typing import TypedDict, Annotated, List, NotRequired
 from dotenv import load_dotenv
 from datetime import datetime
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, RemoveMessage
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
 from langgraph.checkpoint.memory import MemorySaver
 
+from compaction import compact_messages
+from rerank import rerank_node
+from admission import LIMITERS
+
 # ---------------------------------------------------------
 # Load Environment
 # ---------------------------------------------------------
@@ -22,45 +25,120 @@ load_dotenv()
 # ---------------------------------------------------------
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
-
-# ---------------------------------------------------------
-# LLM Setup
-# ---------------------------------------------------------
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.2,
-    convert_system_message_to_human=True,
-)
+    # Running summary of turns that were compacted out of `messages`
+    summary: NotRequired[str]
 
 # ---------------------------------------------------------
 # Tools
 # ---------------------------------------------------------
-from tavily import TavilyClient
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableLambda, RunnableConfig
+
+from search_cache import cached_search, acached_search
+from batch_search import batch_search, abatch_search
+from article_index import ARTICLE_INDEX, LOCAL_INDEX_FIRST
+from stream_encoder import dumps
+from run_control import time_left, MAX_TOOL_ROUNDS
+from metrics import CONTEXT_TOKENS, CONTEXT_COMPACTED, CHAT_LIMIT_HITS
 
 # ---------------------------------------------------------
 # Tools
 # ---------------------------------------------------------
-tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
-
-@tool
-def tavily_search(query: str):
-    """
-    Search for information using Tavily.
-    Returns a list of search results and images.
-    """
-    response = tavily_client.search(query, max_results=10, include_images=True)
+def _search_output(response: dict):
     # Combine results and images into a single list
     # Images are just strings (URLs), results are dicts
-    return {"results": response["results"], "images": response.get("images", [])}
+    output = {"results": response["results"], "images": response.get("images", [])}
+    # The model reads the JSON content; the raw dict rides along as the artifact
+    # so the stream and the reranker don't have to parse it back
+    return dumps(output), output
+
+def _tavily_search(query: str):
+    response = ARTICLE_INDEX.answer(query) if LOCAL_INDEX_FIRST else None
+    if response is None:
+        response = cached_search(query, max_results=10, include_images=True)
+    return _search_output(response)
+
+async def _atavily_search(query: str, config: RunnableConfig):
+    # Upstream calls never outlive the chat run's deadline
+    timeout = time_left(config)
+    configurable = config.get("configurable", {})
+    # Batch runs route searches through a pool shared by every question in the batch
+    search = configurable.get("search_pool", acached_search)
+    # Reuse the speculative search on the user's message when the query is close enough
+    speculative = configurable.get("speculative_search")
+    response = await speculative.take(query) if speculative else None
+    # Optionally answer from the local article index when it has enough fresh matches
+    if response is None and LOCAL_INDEX_FIRST:
+        response = await asyncio.to_thread(ARTICLE_INDEX.answer, query)
+    if response is None:
+        response = await search(query, max_results=10, include_images=True, timeout=timeout)
+    return _search_output(response)
+
+# Sync and async implementations; ToolNode picks the coroutine under ainvoke/astream_events
+tavily_search = StructuredTool.from_function(
+    func=_tavily_search,
+    coroutine=_atavily_search,
+    name="tavily_search",
+    response_format="content_and_artifact",
+    description=(
+        "Search for information using Tavily.\n"
+        "Returns a list of search results and images."
+    ),
+)
+
+def _tavily_batch_search(queries: List[str]):
+    output = batch_search(queries)
+    return dumps(output), output
+
+async def _atavily_batch_search(queries: List[str], config: RunnableConfig):
+    search = config.get("configurable", {}).get("search_pool", acached_search)
+    output = await abatch_search(queries, timeout=time_left(config), search=search)
+    return dumps(output), output
 
-tools = [tavily_search]
-llm_with_tools = llm.bind_tools(tools)
+tavily_batch_search = StructuredTool.from_function(
+    func=_tavily_batch_search,
+    coroutine=_atavily_batch_search,
+    name="tavily_batch_search",
+    response_format="content_and_artifact",
+    description=(
+        "Run several Tavily searches at once.\n"
+        "Takes a list of queries and returns one merged, deduplicated and ranked "
+        "list of search results and images."
+    ),
+)
+
+tools = [tavily_search, tavily_batch_search]
+
+# ---------------------------------------------------------
+# LLM Setup
+# ---------------------------------------------------------
+# Built on first use (or by the startup warmup): the Gemini SDK is slow to
+# import, and a missing key should fail the chat, not the whole process
+llm = None
+llm_with_tools = None
+# Same tools visible in the history, but the model has to answer now
+llm_answer_only = None
+_llm_lock = threading.Lock()
+
+def load_llm():
+    global llm, llm_with_tools, llm_answer_only
+    with _llm_lock:
+        if llm_with_tools is None:
+            if llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                llm = ChatGoogleGenerativeAI(
+                    model="gemini-2.5-flash",
+                    temperature=0.2,
+                    convert_system_message_to_human=True,
+                )
+            llm_with_tools = llm.bind_tools(tools)
+            llm_answer_only = llm.bind_tools(tools, tool_choice="none")
+    return llm_with_tools, llm_answer_only
 
 # ---------------------------------------------------------
 # Agent Node
 # ---------------------------------------------------------
-def agent_node(state: AgentState):
+def build_prompt(state: AgentState):
     current_date = datetime.now().strftime("%Y-%m-%d")
     
     system_prompt = SystemMessage(f"""
@@ -73,6 +151,7 @@ Instructions:
 2. **Formulate Search Queries**: If the request requires external knowledge (news, facts, data) OR if the user asks about a specific entity (person, place, thing), **ALWAYS** generate specific and optimized search queries for the `tavily_search` tool.
    - Even if the query is misspelled (e.g., "rinalod"), try to infer the correct entity (e.g., "Ronaldo") and SEARCH for it.
    - Do NOT ask for clarification unless absolutely necessary. Better to search for the most likely intent.
+   - If you need more than one search, call `tavily_batch_search` ONCE with all the queries instead of several `tavily_search` calls.
 3. **Synthesize Answers**:
    -
     When you receive search results, analyze them carefully.
@@ -84,10 +163,72 @@ Instructions:
 Always prioritize accuracy and helpfulness.
 """)
 
-    messages = [system_prompt] + state["messages"]
-    ai_reply = llm_with_tools.invoke(messages)
+    history, summary, rolled, stats = compact_messages(state["messages"], state.get("summary", ""))
+    if summary:
+        system_prompt.content += f"\nSummary of the earlier conversation:\n{summary}\n"
+    CONTEXT_TOKENS.inc(stats["tokens_before"], stage="before")
+    CONTEXT_TOKENS.inc(stats["tokens_after"], stage="after")
+    CONTEXT_COMPACTED.inc(stats["tool_outputs_trimmed"], kind="tool_outputs_trimmed")
+    CONTEXT_COMPACTED.inc(stats["turns_summarized"], kind="turns_summarized")
+
+    return [system_prompt] + history, summary, rolled, stats
+
+def _turn_stats(messages, stats):
+    """
+    Compaction stats for the whole turn so far: turns are usually rolled into
+    the summary on the turn's first agent call, so each reply adds its call to
+    the previous reply's totals.
+    """
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            break
+        previous = m.response_metadata.get("compaction") if isinstance(m, AIMessage) else None
+        if previous:
+            return {
+                **stats,
+                "tokens_before": previous["tokens_before"],
+                "turns_summarized": previous["turns_summarized"] + stats["turns_summarized"],
+                "agent_calls": previous.get("agent_calls", 1) + 1,
+            }
+    return {**stats, "agent_calls": 1}
+
+def _agent_update(state, ai_reply, summary, rolled, stats):
+    ai_reply.response_metadata["compaction"] = _turn_stats(state["messages"], stats)
+
+    update = {"messages": [RemoveMessage(id=m.id) for m in rolled] + [ai_reply]}
+    if rolled:
+        update["summary"] = summary
+    return update
+
+def tool_rounds(messages) -> int:
+    """Tool-calling replies since the latest user message."""
+    rounds = 0
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            break
+        if isinstance(m, AIMessage) and m.tool_calls:
+            rounds += 1
+    return rounds
+
+def _pick_llm(state: AgentState, config: RunnableConfig):
+    with_tools, answer_only = load_llm()
+    max_rounds = (config or {}).get("configurable", {}).get("max_tool_rounds", MAX_TOOL_ROUNDS)
+    if tool_rounds(state["messages"]) >= max_rounds:
+        # Answer from the results so far
+        CHAT_LIMIT_HITS.inc(limit="tool_rounds")
+        return answer_only
+    return with_tools
+
+def agent_node(state: AgentState, config: RunnableConfig):
+    messages, summary, rolled, stats = build_prompt(state)
+    ai_reply = _pick_llm(state, config).invoke(messages)
+    return _agent_update(state, ai_reply, summary, rolled, stats)
 
-    return {"messages": [ai_reply]}
+async def aagent_node(state: AgentState, config: RunnableConfig):
+    messages, summary, rolled, stats = build_prompt(state)
+    async with LIMITERS["gemini"].slot():
+        ai_reply = await _pick_llm(state, config).ainvoke(messages)
+    return _agent_update(state, ai_reply, summary, rolled, stats)
 
 # ---------------------------------------------------------
 # Should Continue (Tool or End)
@@ -102,11 +243,13 @@ def should_continue(state: AgentState):
 # ---------------------------------------------------------
 # Create Graph
 # ---------------------------------------------------------
-def create_graph():
+def create_graph(checkpointer=None):
     graph = StateGraph(AgentState)
 
-    graph.add_node("agent", agent_node)
+    # Sync and async variants; astream_events runs the async one
+    graph.add_node("agent", RunnableLambda(agent_node, afunc=aagent_node))
     graph.add_node("tools", ToolNode(tools))
+    graph.add_node("rerank", rerank_node)
 
     graph.set_entry_point("agent")
 
@@ -119,13 +262,16 @@ def create_graph():
         }
     )
 
-    graph.add_edge("tools", "agent")
+    # Trim search dumps to their relevant passages before the agent sees them
+    graph.add_edge("tools", "rerank")
+    graph.add_edge("rerank", "agent")
 
-    # Initialize MemorySaver
-    memory = MemorySaver()
+    # Default to an in-process MemorySaver; the server passes its bounded SQLite store
+    if checkpointer is None:
+        checkpointer = MemorySaver()
 
     # Compile with checkpointer
-    return graph.compile(checkpointer=memory)
+    return graph.compile(checkpointer=checkpointer)
 
 # ---------------------------------------------------------
 # Main Execution
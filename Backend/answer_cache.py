@@ -0,0 +1,96 @@
+import os
+import re
+import time
+from collections import OrderedDict
+
+from search_cache import normalize_query
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", 300))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 256))
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def answer_key(question: str) -> str:
+    return normalize_query(PUNCTUATION_RE.sub(" ", question))
+
+
+# ---------------------------------------------------------
+# Cache
+# ---------------------------------------------------------
+class AnswerCache:
+    """
+    Full emitted chat streams for first-turn questions, keyed on the
+    normalized question. Each entry is the ordered list of (kind, payload)
+    records ("text", "sources", "images") so a hit can be replayed as-is.
+    """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> {"records", "created_at", "hits", "last_hit"}
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, question: str):
+        key = answer_key(question)
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry["created_at"] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        entry["hits"] += 1
+        entry["last_hit"] = time.time()
+        self.hits += 1
+        return entry["records"]
+
+    def put(self, question: str, records):
+        # Only complete answers are worth replaying
+        if not any(kind == "text" for kind, _ in records):
+            return
+        key = answer_key(question)
+        self._entries[key] = {"records": list(records), "created_at": time.time(), "hits": 0, "last_hit": None}
+        self._entries.move_to_end(key)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, question: str = None) -> int:
+        if question is None:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+        return 1 if self._entries.pop(answer_key(question), None) is not None else 0
+
+    def stats(self):
+        now = time.time()
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "keys": {
+                key: {
+                    "hits": entry["hits"],
+                    "age": round(now - entry["created_at"], 1),
+                    "last_hit": entry["last_hit"],
+                }
+                for key, entry in self._entries.items()
+            },
+        }
+
+
+def answer_text(records) -> str:
+    return "".join(payload for kind, payload in records if kind == "text")
+
+
+ANSWER_CACHE = AnswerCache()
@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from text_utils import canonical_url, STOPWORDS
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+ARTICLE_INDEX_DB = os.environ.get("ARTICLE_INDEX_DB", "articles.sqlite")
+# Articles older than this are pruned
+MAX_AGE = float(os.environ.get("ARTICLE_INDEX_MAX_AGE", 7 * 24 * 3600))
+MAX_ROWS = int(os.environ.get("ARTICLE_INDEX_MAX_ROWS", 50000))
+PRUNE_EVERY = 200  # inserts between prune passes
+
+# Agent search answers from the index first when this many fresh matches exist
+LOCAL_INDEX_FIRST = os.environ.get("LOCAL_INDEX_FIRST", "0").lower() in ("1", "true", "yes")
+LOCAL_INDEX_MIN_RESULTS = int(os.environ.get("LOCAL_INDEX_MIN_RESULTS", 5))
+LOCAL_INDEX_FRESHNESS = float(os.environ.get("LOCAL_INDEX_FRESHNESS", 1800))
+# Share of query terms a local match must contain to count
+MIN_TERM_COVERAGE = 0.6
+
+TERM_RE = re.compile(r"\w+")
+
+
+# ---------------------------------------------------------
+# Index
+# ---------------------------------------------------------
+class ArticleIndex:
+    """
+    Persistent SQLite FTS5 index of every search result we fetch, deduped by
+    canonical URL and pruned by age and row count.
+    """
+
+    def __init__(self, path: str = ARTICLE_INDEX_DB, max_age: float = MAX_AGE, max_rows: int = MAX_ROWS):
+        self.path = path
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self._conn = None
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        self.indexed = 0
+        self.searches = 0
+        self.local_answers = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Caller holds self._lock
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS articles (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    title TEXT,
+                    content TEXT,
+                    topic TEXT,
+                    fetched_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS articles_fetched_at ON articles (fetched_at);
+                CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                    title, content, content='articles', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+                    INSERT INTO articles_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+                    INSERT INTO articles_fts (articles_fts, rowid, title, content)
+                    VALUES ('delete', old.id, old.title, old.content);
+                END;
+            """)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def add(self, results, topic: str = "general"):
+        """Upserts search results; a re-fetched URL replaces its older copy."""
+        rows = []
+        now = time.time()
+        for r in results or []:
+            url = r.get("url")
+            if not url:
+                continue
+            rows.append((canonical_url(url), r.get("title") or "", r.get("raw_content") or r.get("content") or "", topic, now))
+        if not rows:
+            return 0
+
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany("DELETE FROM articles WHERE url = ?", [(row[0],) for row in rows])
+                db.executemany(
+                    "INSERT INTO articles (url, title, content, topic, fetched_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+            self.indexed += len(rows)
+            self._inserts += len(rows)
+            if self._inserts >= PRUNE_EVERY:
+                self._inserts = 0
+                self._prune(db)
+        return len(rows)
+
+    def _prune(self, db):
+        with db:
+            db.execute("DELETE FROM articles WHERE fetched_at < ?", (time.time() - self.max_age,))
+            db.execute(
+                "DELETE FROM articles WHERE id IN ("
+                "SELECT id FROM articles ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+
+    def prune(self):
+        with self._lock:
+            self._prune(self._db())
+
+    def search(self, query: str, limit: int = 10, max_age: float = None, topic: str = None):
+        """
+        Full-text search ranked by BM25. Only articles containing at least
+        MIN_TERM_COVERAGE of the query terms are returned.
+        """
+        terms = [t for t in dict.fromkeys(TERM_RE.findall(query.lower())) if t not in STOPWORDS]
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        sql = (
+            "SELECT a.url, a.title, a.content, a.topic, a.fetched_at, bm25(articles_fts) AS rank "
+            "FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+            "WHERE articles_fts MATCH ?"
+        )
+        params = [match]
+        if max_age is not None:
+            sql += " AND a.fetched_at >= ?"
+            params.append(time.time() - max_age)
+        if topic is not None:
+            sql += " AND a.topic = ?"
+            params.append(topic)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit * 3)
+
+        with self._lock:
+            self.searches += 1
+            rows = self._db().execute(sql, params).fetchall()
+
+        matches = []
+        for url, title, content, row_topic, fetched_at, rank in rows:
+            words = set(TERM_RE.findall(f"{title} {content}".lower()))
+            if sum(t in words for t in terms) / len(terms) < MIN_TERM_COVERAGE:
+                continue
+            matches.append({
+                "url": url,
+                "title": title,
+                "content": content,
+                "topic": row_topic,
+                "fetched_at": fetched_at,
+                "score": -rank,
+            })
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def answer(self, query: str, limit: int = 10):
+        """Fresh local matches for the agent, or None when upstream is needed."""
+        matches = self.search(query, limit=limit, max_age=LOCAL_INDEX_FRESHNESS)
+        if len(matches) < LOCAL_INDEX_MIN_RESULTS:
+            return None
+        self.local_answers += 1
+        return {"results": matches, "images": []}
+
+    def stats(self):
+        with self._lock:
+            rows = self._db().execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        return {
+            "rows": rows,
+            "max_rows": self.max_rows,
+            "max_age": self.max_age,
+            "indexed": self.indexed,
+            "searches": self.searches,
+            "local_answers": self.local_answers,
+        }
+
+
+ARTICLE_INDEX = ArticleIndex()
@@ -0,0 +1,222 @@
+"""
+Runs many chat questions through the agent graph at once.
+
+Used by POST /api/chat/batch and as a CLI for evaluation runs:
+
+    python batch_chat.py questions.txt --concurrency 8 --output answers.ndjson
+
+The input file holds one question per line, a JSON list of strings, or
+JSONL objects with a "question" field.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+import admission
+from search_cache import acached_search
+from speculation import query_terms
+from run_control import run_config, CHAT_DEADLINE
+from chat_stream import agent_records
+from stream_encoder import dumps
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CHAT_CONCURRENCY", 4))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_CHAT_MAX_CONCURRENCY", 16))
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_CHAT_MAX_QUESTIONS", 500))
+# Minimum word overlap (Jaccard) for two queries in a batch to share one search
+DEDUPE_THRESHOLD = float(os.environ.get("BATCH_DEDUPE_THRESHOLD", 0.8))
+
+
+# ---------------------------------------------------------
+# Shared Searches
+# ---------------------------------------------------------
+class SharedSearchPool:
+    """
+    Search front-end shared by every question in one batch: a query close
+    enough to one already issued in the batch awaits that search instead of
+    making its own upstream call.
+    """
+
+    def __init__(self, threshold: float = DEDUPE_THRESHOLD):
+        self.threshold = threshold
+        self._searches = []  # (terms, topic, max_results, include_images, task)
+
+        self.requested = 0
+        self.upstream = 0
+
+    def _match(self, terms: set, topic: str, max_results: int, include_images: bool):
+        for other, other_topic, other_max, other_images, task in self._searches:
+            if (other_topic, other_max, other_images) != (topic, max_results, include_images) or not (terms and other):
+                continue
+            if len(terms & other) / len(terms | other) >= self.threshold:
+                return task
+        return None
+
+    def _finished(self, task: asyncio.Task):
+        # A failed search is dropped so the next similar query tries again
+        if task.cancelled() or task.exception() is not None:
+            self._searches = [entry for entry in self._searches if entry[-1] is not task]
+
+    async def search(self, query: str, topic: str = "general", max_results: int = 5,
+                     include_images: bool = False, timeout: float = None):
+        self.requested += 1
+        terms = query_terms(query)
+        task = self._match(terms, topic, max_results, include_images)
+        if task is None:
+            self.upstream += 1
+            # Not bound by this caller's timeout: each caller only bounds its own wait
+            task = asyncio.create_task(acached_search(
+                query, topic=topic, max_results=max_results, include_images=include_images
+            ))
+            task.add_done_callback(self._finished)
+            self._searches.append((terms, topic, max_results, include_images, task))
+        # One question giving up must not cancel the search for the others
+        if timeout is None:
+            return await asyncio.shield(task)
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def stats(self):
+        return {
+            "searches_requested": self.requested,
+            "searches_upstream": self.upstream,
+            "searches_saved": self.requested - self.upstream,
+        }
+
+
+# ---------------------------------------------------------
+# Batch
+# ---------------------------------------------------------
+async def _answer(app, index: int, question: str, pool: SharedSearchPool, batch_id: str, deadline: float):
+    config = run_config(f"batch-{batch_id}-{index}", deadline)
+    config["configurable"]["search_pool"] = pool.search
+
+    started = time.perf_counter()
+    ttft = None
+    text, sources, error = [], [], None
+    try:
+        async with asyncio.timeout(deadline):
+            async for kind, payload in agent_records(app, question, config):
+                if kind == "text":
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    text.append(payload)
+                elif kind == "sources":
+                    sources = [{"title": r.get("title"), "url": r.get("url")} for r in payload]
+    except TimeoutError:
+        error = f"no answer within {deadline:g} seconds"
+    except Exception as e:
+        error = str(e)
+
+    return {
+        "index": index,
+        "question": question,
+        "answer": "".join(text),
+        "sources": sources,
+        "latency": round(time.perf_counter() - started, 3),
+        "ttft": round(ttft, 3) if ttft is not None else None,
+        "error": error,
+    }
+
+
+async def run_batch(app, questions, concurrency: int = BATCH_CONCURRENCY, deadline: float = CHAT_DEADLINE):
+    """
+    Answers every question with at most `concurrency` graph runs in flight.
+    Yields one result dict per question in completion order, then a summary.
+    """
+    admission.set_priority(admission.DASHBOARD)
+    pool = SharedSearchPool()
+    batch_id = uuid.uuid4().hex[:8]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+
+    async def one(index, question):
+        async with semaphore:
+            return await _answer(app, index, question, pool, batch_id, deadline)
+
+    tasks = [asyncio.create_task(one(i, q)) for i, q in enumerate(questions)]
+    latencies = []
+    failed = 0
+    try:
+        for finished in asyncio.as_completed(tasks):
+            item = await finished
+            latencies.append({"index": item["index"], "latency": item["latency"]})
+            failed += item["error"] is not None
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "summary": {
+            "batch_id": batch_id,
+            "questions": len(questions),
+            "succeeded": len(questions) - failed,
+            "failed": failed,
+            "seconds": round(time.perf_counter() - started, 3),
+            "concurrency": concurrency,
+            **pool.stats(),
+            "per_item": sorted(latencies, key=lambda x: x["index"]),
+        }
+    }
+
+
+async def ndjson_lines(items):
+    async for item in items:
+        yield dumps(item) + "\n"
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def load_questions(path: str):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return [q for q in json.loads(text) if q]
+    questions = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return questions
+
+
+async def _cli(args):
+    from agent import create_graph
+
+    questions = load_questions(args.questions)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        async for item in run_batch(create_graph(), questions, args.concurrency, args.deadline):
+            out.write(dumps(item) + "\n")
+            out.flush()
+            if "summary" in item and out is not sys.stdout:
+                summary = item["summary"]
+                print(
+                    f"{summary['succeeded']}/{summary['questions']} answered in {summary['seconds']}s, "
+                    f"{summary['searches_saved']} of {summary['searches_requested']} searches saved"
+                )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a file of questions through the agent graph.")
+    parser.add_argument("questions", help="text (one per line), JSON list or JSONL with 'question'")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--deadline", type=float, default=CHAT_DEADLINE, help="seconds per question")
+    parser.add_argument("--output", help="NDJSON output file (default: stdout)")
+    asyncio.run(_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
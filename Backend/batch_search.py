@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from search_cache import cached_search, acached_search
+from text_utils import canonical_url
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+MAX_QUERIES = int(os.environ.get("BATCH_SEARCH_MAX_QUERIES", 5))
+MAX_RESULTS_PER_QUERY = int(os.environ.get("BATCH_SEARCH_RESULTS_PER_QUERY", 10))
+MAX_MERGED_RESULTS = int(os.environ.get("BATCH_SEARCH_MAX_RESULTS", 12))
+MAX_MERGED_IMAGES = int(os.environ.get("BATCH_SEARCH_MAX_IMAGES", 10))
+# Ranking bonus for every additional query that returned the same URL
+MULTI_HIT_BONUS = 0.1
+
+# ---------------------------------------------------------
+# Merging
+# ---------------------------------------------------------
+def merge_responses(responses):
+    """
+    Merges (query, response, seconds) tuples into one ranked, deduped result set.
+    Results are ordered by their best Tavily score plus a bonus per extra query hit.
+    """
+    merged = {}  # canonical url -> {"result", "score", "hits"}
+    images = []
+    seen_images = set()
+    duplicates = 0
+    per_query = []
+
+    for query, response, seconds in responses:
+        results = (response or {}).get("results", [])
+        per_query.append({
+            "query": query,
+            "results": len(results),
+            "seconds": round(seconds, 3),
+            "error": response is None,
+        })
+        for result in results:
+            key = canonical_url(result.get("url", ""))
+            score = result.get("score") or 0.0
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = {"result": result, "score": score, "hits": 1}
+                continue
+            duplicates += 1
+            entry["hits"] += 1
+            if score > entry["score"]:
+                entry["result"], entry["score"] = result, score
+        for image in (response or {}).get("images", []):
+            image_key = image if isinstance(image, str) else image.get("url")
+            if image_key not in seen_images:
+                seen_images.add(image_key)
+                images.append(image)
+
+    ranked = sorted(
+        merged.values(),
+        key=lambda e: e["score"] + MULTI_HIT_BONUS * (e["hits"] - 1),
+        reverse=True,
+    )
+    return {
+        "results": [e["result"] for e in ranked[:MAX_MERGED_RESULTS]],
+        "images": images[:MAX_MERGED_IMAGES],
+        "stats": {
+            "queries": per_query,
+            "unique_results": len(merged),
+            "duplicates": duplicates,
+            "returned": min(len(ranked), MAX_MERGED_RESULTS),
+        },
+    }
+
+
+def _dedupe_queries(queries):
+    unique = []
+    for q in queries:
+        if q and q.strip() and q.strip() not in unique:
+            unique.append(q.strip())
+    return unique[:MAX_QUERIES]
+
+
+# ---------------------------------------------------------
+# Fan-out
+# ---------------------------------------------------------
+async def abatch_search(queries, timeout: float = None, search=acached_search):
+    async def one(query):
+        started = time.perf_counter()
+        try:
+            response = await search(
+                query, max_results=MAX_RESULTS_PER_QUERY, include_images=True, timeout=timeout
+            )
+        except Exception as e:
+            print(f"Batch search failed for {query!r}: {e}")
+            response = None
+        return query, response, time.perf_counter() - started
+
+    return merge_responses(await asyncio.gather(*(one(q) for q in _dedupe_queries(queries))))
+
+
+def batch_search(queries):
+    def one(query):
+        started = time.perf_counter()
+        try:
+            response = cached_search(query, max_results=MAX_RESULTS_PER_QUERY, include_images=True)
+        except Exception as e:
+            print(f"Batch search failed for {query!r}: {e}")
+            response = None
+        return query, response, time.perf_counter() - started
+
+    queries = _dedupe_queries(queries)
+    if not queries:
+        return merge_responses([])
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        return merge_responses(list(pool.map(one, queries)))
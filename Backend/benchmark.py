@@ -0,0 +1,337 @@
+"""
+Offline load test for the backend.
+
+Gemini and Tavily are replaced by local fakes with configurable latency,
+token rate and payload size, the app is served by an in-process uvicorn
+server, and /api/chat, /api/finance and /api/discover are driven at a fixed
+concurrency. Results are written as JSON so runs can be compared across
+commits.
+
+    python benchmark.py --requests 200 --concurrency 16 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FINANCE_CATEGORIES = ["us_markets", "crypto", "earnings", "screener", "politicians"]
+DISCOVER_CATEGORIES = ["for_you", "top", "tech_science", "finance", "arts_culture", "sports", "entertainment"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark with fake Gemini and Tavily.")
+    parser.add_argument("--scenarios", default="chat,finance,discover",
+                        help="comma-separated subset of chat,finance,discover")
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--distinct-questions", type=int, default=None,
+                        help="chat questions cycle through this many variants (default: all distinct)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=150.0)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--search-latency", type=float, default=0.4, help="seconds per Tavily call")
+    parser.add_argument("--search-results", type=int, default=8)
+    parser.add_argument("--result-chars", type=int, default=2000, help="content size of each result")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="lift the Tavily/Gemini admission limits so only our own code is measured")
+    parser.add_argument("--output", default="benchmark_results.json")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, workdir: str):
+    """Must run before the app modules are imported: they read their config at import time."""
+    os.environ["GOOGLE_API_KEY"] = "benchmark"
+    os.environ["TAVILY_API_KEY"] = "benchmark"
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ["ARTICLE_INDEX_DB"] = os.path.join(workdir, "articles.sqlite")
+    os.environ["SHARED_CACHE_DB"] = os.path.join(workdir, "shared_cache.sqlite")
+    if args.no_rate_limit:
+        for name in ("TAVILY", "GEMINI"):
+            os.environ[f"{name}_RATE_LIMIT"] = "100000"
+            os.environ[f"{name}_BURST"] = "100000"
+            os.environ[f"{name}_CONCURRENCY"] = "100000"
+
+
+# ---------------------------------------------------------
+# Fakes
+# ---------------------------------------------------------
+def fake_tavily_transport(args):
+    """httpx transport answering Tavily /search calls locally."""
+    import httpx
+
+    filler = ("lorem ipsum dolor sit amet market report analysis " * (args.result_chars // 40 + 1))[:args.result_chars]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(args.search_latency)
+        body = json.loads(request.content)
+        query = body.get("query", "")
+        count = min(args.search_results, body.get("max_results", args.search_results))
+        results = [
+            {
+                "title": f"{query} - result {i}",
+                "url": f"https://example.com/{abs(hash(query)) % 100000}/{i}",
+                "content": f"{query} {filler}",
+                "score": 1.0 - i / max(count, 1),
+            }
+            for i in range(count)
+        ]
+        images = [f"https://example.com/img/{abs(hash(query)) % 100000}/{i}.jpg" for i in range(3)]
+        return httpx.Response(200, json={"query": query, "results": results, "images": images})
+
+    return httpx.MockTransport(handler)
+
+
+def fake_chat_model(args):
+    """Chat model that searches once per question, then streams an answer at a fixed token rate."""
+    from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+    from langchain_core.messages import AIMessageChunk, HumanMessage
+    from langchain_core.outputs import ChatGenerationChunk
+
+    class FakeChatModel(BaseChatModel):
+        latency: float
+        tokens_per_second: float
+        answer_tokens: int
+
+        @property
+        def _llm_type(self) -> str:
+            return "benchmark-fake"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _chunks(self, messages):
+            last = messages[-1]
+            if isinstance(last, HumanMessage):
+                args = json.dumps({"query": last.content})
+                yield AIMessageChunk(content="", tool_call_chunks=[
+                    {"name": "tavily_search", "args": args, "id": f"call_{time.monotonic_ns()}", "index": 0}
+                ])
+                return
+            for i in range(self.answer_tokens):
+                yield AIMessageChunk(content=f"token{i} " if i % 20 else f"[{i // 20 + 1}] ")
+            prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+            yield AIMessageChunk(content="", usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": self.answer_tokens,
+                "total_tokens": prompt_tokens + self.answer_tokens,
+            })
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self.latency)
+            for chunk in self._chunks(messages):
+                if chunk.content:
+                    time.sleep(1 / self.tokens_per_second)
+                yield ChatGenerationChunk(message=chunk)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(self.latency)
+            for chunk in self._chunks(messages):
+                if chunk.content:
+                    await asyncio.sleep(1 / self.tokens_per_second)
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager and chunk.content:
+                    await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+    return FakeChatModel(latency=args.llm_latency, tokens_per_second=args.tokens_per_second,
+                         answer_tokens=args.answer_tokens)
+
+
+def install_fakes(args):
+    import agent
+    from search_client import SEARCH_CLIENT
+
+    model = fake_chat_model(args)
+    agent.llm = agent.llm_with_tools = agent.llm_answer_only = model
+    SEARCH_CLIENT.transport = fake_tavily_transport(args)
+
+
+# ---------------------------------------------------------
+# Server
+# ---------------------------------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int):
+    """Runs the app in a background thread with its own event loop."""
+    import uvicorn
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("benchmark server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+# ---------------------------------------------------------
+# Load
+# ---------------------------------------------------------
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "p50": round(pick(0.50), 4),
+        "p95": round(pick(0.95), 4),
+        "p99": round(pick(0.99), 4),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+async def chat_request(client, i: int, args):
+    distinct = args.distinct_questions or args.requests
+    question = f"benchmark question {i % distinct}: what changed in markets today?"
+    started = time.perf_counter()
+    ttft = None
+    async with client.stream("POST", "/api/chat", json={"messages": [{"role": "user", "content": question}]}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if ttft is None and line.startswith("0:"):
+                if line.startswith('0:"Error'):
+                    raise RuntimeError(line[2:])
+                ttft = time.perf_counter() - started
+    return time.perf_counter() - started, ttft
+
+
+async def finance_request(client, i: int, args):
+    started = time.perf_counter()
+    response = await client.get("/api/finance", params={"category": FINANCE_CATEGORIES[i % len(FINANCE_CATEGORIES)]})
+    response.raise_for_status()
+    return time.perf_counter() - started, None
+
+
+async def discover_request(client, i: int, args):
+    started = time.perf_counter()
+    response = await client.get("/api/discover", params={"category": DISCOVER_CATEGORIES[i % len(DISCOVER_CATEGORIES)]})
+    response.raise_for_status()
+    return time.perf_counter() - started, None
+
+
+SCENARIOS = {"chat": chat_request, "finance": finance_request, "discover": discover_request}
+
+
+async def run_scenario(base_url: str, name: str, args):
+    import httpx
+
+    request = SCENARIOS[name]
+    latencies, ttfts, errors = [], [], []
+    next_index = iter(range(args.requests))
+
+    async def worker(client):
+        for i in next_index:
+            try:
+                latency, ttft = await request(client, i, args)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(latency)
+            if ttft is not None:
+                ttfts.append(ttft)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": args.requests,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": percentiles(latencies),
+    }
+    if ttfts:
+        result["ttft"] = percentiles(ttfts)
+    return result
+
+
+def peak_rss_mb():
+    """Peak RSS of this process (server and load generator together)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="perplexity-bench-") as workdir:
+        configure_environment(args, workdir)
+        install_fakes(args)
+        port = free_port()
+        server, thread = start_server(port)
+        try:
+            results = {}
+            for name in scenarios:
+                print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}...")
+                results[name] = asyncio.run(run_scenario(f"http://127.0.0.1:{port}", name, args))
+                summary = results[name]["latency"] or {}
+                print(f"  {results[name]['rps']} req/s, p50 {summary.get('p50')}s, p99 {summary.get('p99')}s, "
+                      f"{results[name]['errors']} errors")
+        finally:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Peak RSS {report['peak_rss_mb']} MB; results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from langchain_core.messages import HumanMessage
+
+from speculation import SpeculativeSearch, with_speculation
+from metrics import ChatTimer
+
+
+async def agent_records(app, question: str, config: dict, speculative: SpeculativeSearch = None, timer: ChatTimer = None):
+    """
+    Runs the compiled agent graph `app` for one question and yields (kind, payload) records
+    in protocol order: "text" chunks, "sources" and "images".
+    """
+    # Sources already streamed, so a reused speculative result isn't sent twice
+    emitted_sources = None
+
+    events = app.astream_events(
+        {"messages": [HumanMessage(content=question)]},
+        config=config,
+        version="v2"
+    )
+    async for event in with_speculation(events, speculative):
+        kind = event["event"]
+        if timer is not None:
+            timer.on_event(event)
+        
+        # Stream Text Tokens
+        if kind == "on_chat_model_stream":
+            content = event["data"]["chunk"].content
+            if content:
+                yield "text", content
+        
+        # Stream Tool Output (Sources & Images), including a landed speculative search
+        elif kind in ("on_tool_end", "on_speculative_search"):
+            output = event["data"].get("output")
+            
+            # Search tools hand back their raw result as the ToolMessage artifact
+            tool_result = None
+            if isinstance(getattr(output, "artifact", None), dict):
+                tool_result = output.artifact
+            elif isinstance(output, dict) and "results" in output:
+                tool_result = output
+            
+            if tool_result:
+                sources = [r.get("url") for r in tool_result.get("results", [])]
+                if sources == emitted_sources:
+                    continue
+                emitted_sources = sources
+
+                # Stream Images
+                if "images" in tool_result and tool_result["images"]:
+                    yield "images", tool_result["images"]
+                
+                # Stream Sources
+                if "results" in tool_result and tool_result["results"]:
+                    yield "sources", tool_result["results"]
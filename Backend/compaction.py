@@ -0,0 +1,149 @@
+import os
+import json
+from typing import List
+
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# Approximate prompt budget (history + summary) for each agent call.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 12000))
+# The newest turns (including the one in progress) are always sent verbatim.
+KEEP_RECENT_TURNS = max(1, int(os.environ.get("CONTEXT_KEEP_RECENT_TURNS", 2)))
+SNIPPET_CHARS = int(os.environ.get("CONTEXT_SNIPPET_CHARS", 200))
+SUMMARY_MAX_CHARS = int(os.environ.get("CONTEXT_SUMMARY_MAX_CHARS", 4000))
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+# ---------------------------------------------------------
+# Token Estimation
+# ---------------------------------------------------------
+def message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+
+def estimate_tokens(messages: List[BaseMessage], summary: str = "") -> int:
+    chars = len(summary)
+    for m in messages:
+        chars += len(message_text(m))
+        if getattr(m, "tool_calls", None):
+            chars += len(json.dumps(m.tool_calls, default=str))
+    return chars // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS * len(messages)
+
+
+# ---------------------------------------------------------
+# Compaction Steps
+# ---------------------------------------------------------
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """A turn starts at each HumanMessage and runs until the next one."""
+    turns = []
+    for m in messages:
+        if isinstance(m, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return turns
+
+
+def _snippet(text: str) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= SNIPPET_CHARS else text[:SNIPPET_CHARS].rstrip() + "..."
+
+
+def trim_tool_message(message: ToolMessage) -> ToolMessage:
+    """Reduces a search dump to title / URL / short snippet per result."""
+    text = message_text(message)
+    try:
+        payload = json.loads(text)
+        results = payload.get("results", [])
+        trimmed = json.dumps({
+            "results": [
+                {"title": r.get("title"), "url": r.get("url"), "content": _snippet(r.get("content", ""))}
+                for r in results
+            ]
+        }, ensure_ascii=False)
+    except (ValueError, AttributeError, TypeError):
+        trimmed = _snippet(text)
+    if len(trimmed) >= len(text):
+        return message
+    return message.model_copy(update={"content": trimmed})
+
+
+def summarize_turn(turn: List[BaseMessage]) -> str:
+    question = next((message_text(m) for m in turn if isinstance(m, HumanMessage)), "")
+    answers = [m for m in turn if isinstance(m, AIMessage) and not m.tool_calls]
+    answer = message_text(answers[-1]) if answers else ""
+    line = f"- User asked: {_snippet(question)}"
+    if answer:
+        line += f"\n  Assistant answered: {_snippet(answer)}"
+    return line
+
+
+def compact_messages(messages: List[BaseMessage], summary: str = "", budget: int = CONTEXT_TOKEN_BUDGET):
+    """
+    Fits the conversation history into `budget` tokens.
+
+    Returns (prompt_messages, summary, rolled, stats). Older tool outputs are
+    trimmed for the prompt only; when that is not enough, the oldest turns are
+    folded into `summary` and returned in `rolled` so the caller can drop them
+    from the graph state.
+    """
+    tokens_before = estimate_tokens(messages, summary)
+    turns = split_turns(messages)
+    old, recent = turns[:-KEEP_RECENT_TURNS], turns[-KEEP_RECENT_TURNS:]
+
+    compacted_old = []
+    trimmed_per_turn = []
+    for turn in old:
+        compacted_turn = []
+        trimmed = 0
+        for m in turn:
+            if isinstance(m, ToolMessage):
+                short = trim_tool_message(m)
+                trimmed += short is not m
+                m = short
+            compacted_turn.append(m)
+        compacted_old.append(compacted_turn)
+        trimmed_per_turn.append(trimmed)
+
+    recent_messages = [m for turn in recent for m in turn]
+    rolled = []
+    rolled_turns = 0
+    summary_lines = [summary] if summary else []
+
+    def current_tokens():
+        history = [m for turn in compacted_old for m in turn] + recent_messages
+        return estimate_tokens(history, "\n".join(summary_lines))
+
+    while compacted_old and current_tokens() > budget:
+        compacted_old.pop(0)
+        trimmed_per_turn.pop(0)
+        turn = old.pop(0)
+        rolled.extend(turn)
+        rolled_turns += 1
+        summary_lines.append(summarize_turn(turn))
+
+    summary = "\n".join(summary_lines)
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = "..." + summary[-SUMMARY_MAX_CHARS:]
+
+    prompt_messages = [m for turn in compacted_old for m in turn] + recent_messages
+    stats = {
+        "tokens_before": tokens_before,
+        "tokens_after": estimate_tokens(prompt_messages, summary),
+        "tool_outputs_trimmed": sum(trimmed_per_turn),
+        "turns_summarized": rolled_turns,
+        "budget": budget,
+    }
+    return prompt_messages, summary, rolled, stats
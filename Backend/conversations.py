@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+CHECKPOINT_DB = os.environ.get("CHECKPOINT_DB", "checkpoints.sqlite")
+# Conversations kept at all; the least recently used are dropped past this.
+MAX_THREADS = int(os.environ.get("CONVERSATION_MAX_THREADS", 1000))
+# Conversations untouched for this many seconds are dropped.
+IDLE_TTL = float(os.environ.get("CONVERSATION_IDLE_TTL", 6 * 3600))
+# Checkpoints kept per conversation; only the latest is needed to resume.
+MAX_CHECKPOINTS = max(1, int(os.environ.get("CONVERSATION_MAX_CHECKPOINTS", 2)))
+MAINTENANCE_INTERVAL = float(os.environ.get("CONVERSATION_MAINTENANCE_INTERVAL", 300))
+
+
+# ---------------------------------------------------------
+# Conversation Store
+# ---------------------------------------------------------
+class ConversationStore:
+    """
+    Owns the SQLite checkpointer used by the agent graph and keeps it bounded:
+    a per-thread checkpoint cap, an LRU cap on the number of threads, and
+    eviction of threads that have been idle longer than IDLE_TTL.
+
+    Every worker shares the database, so eviction decides on the
+    `conversation_threads.last_seen` rows at delete time, never on what this
+    worker last saw: a thread another worker just touched is not evicted.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB, max_threads: int = MAX_THREADS,
+                 idle_ttl: float = IDLE_TTL, max_checkpoints: int = MAX_CHECKPOINTS):
+        self.path = path
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self.max_checkpoints = max_checkpoints
+
+        self.saver = None
+        self._conn = None
+        self.threads = 0  # rows in conversation_threads as of our last write
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    async def open(self):
+        self._conn = await aiosqlite.connect(self.path)
+        self.saver = AsyncSqliteSaver(self._conn)
+        await self.saver.setup()
+
+        async with self.saver.lock:
+            await self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_threads ("
+                "thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            await self._conn.commit()
+
+        await self.evict_idle()
+        await self._evict_lru()
+        return self.saver
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+            self.saver = None
+
+    async def touch(self, thread_id: str):
+        """Marks a thread as active, evicting the least recently used past the cap."""
+        now = time.time()
+        async with self.saver.lock:
+            await self._conn.execute(
+                "INSERT OR REPLACE INTO conversation_threads (thread_id, last_seen) VALUES (?, ?)",
+                (thread_id, now),
+            )
+            await self._conn.commit()
+        await self._evict_lru()
+
+    async def prune(self, thread_id: str):
+        """Drops all but the newest `max_checkpoints` checkpoints of a thread."""
+        keep = (
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? "
+            "ORDER BY checkpoint_id DESC LIMIT ?"
+        )
+        async with self.saver.lock:
+            await self._conn.execute(
+                f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN ({keep})",
+                (thread_id, thread_id, self.max_checkpoints),
+            )
+            await self._conn.execute(
+                f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN ({keep})",
+                (thread_id, thread_id, self.max_checkpoints),
+            )
+            await self._conn.commit()
+
+    async def delete(self, thread_id: str):
+        await self.saver.adelete_thread(thread_id)
+        async with self.saver.lock:
+            await self._conn.execute(
+                "DELETE FROM conversation_threads WHERE thread_id = ?", (thread_id,)
+            )
+            await self._conn.commit()
+
+    async def _evict(self, where: str, params) -> int:
+        """
+        Deletes the threads matching `where` together with their checkpoints,
+        in one transaction so a concurrent touch() either lands first (and the
+        thread no longer matches) or after (and starts a fresh thread).
+        """
+        async with self.saver.lock:
+            try:
+                async with self._conn.execute(
+                    f"DELETE FROM conversation_threads WHERE {where} RETURNING thread_id", params
+                ) as cur:
+                    evicted = [row[0] for row in await cur.fetchall()]
+                for table in ("checkpoints", "writes"):
+                    await self._conn.executemany(
+                        f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in evicted]
+                    )
+                await self._conn.commit()
+            except Exception:
+                await self._conn.rollback()
+                raise
+            async with self._conn.execute("SELECT COUNT(*) FROM conversation_threads") as cur:
+                self.threads = (await cur.fetchone())[0]
+        return len(evicted)
+
+    async def evict_idle(self):
+        evicted = await self._evict("last_seen < ?", (time.time() - self.idle_ttl,))
+        self.evicted_idle += evicted
+        return evicted
+
+    async def _evict_lru(self):
+        self.evicted_lru += await self._evict(
+            "thread_id IN (SELECT thread_id FROM conversation_threads ORDER BY last_seen "
+            "LIMIT max(0, (SELECT COUNT(*) FROM conversation_threads) - ?))",
+            (self.max_threads,),
+        )
+
+    async def run_maintenance(self):
+        """Background task: periodically drops idle conversations."""
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            try:
+                evicted = await self.evict_idle()
+                if evicted:
+                    print(f"Evicted {evicted} idle conversations")
+            except Exception as e:
+                print(f"Error during conversation maintenance: {e}")
+
+    def stats(self):
+        return {
+            "threads": self.threads,
+            "max_threads": self.max_threads,
+            "max_checkpoints": self.max_checkpoints,
+            "idle_ttl": self.idle_ttl,
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru,
+        }
+
+
+CONVERSATIONS = ConversationStore()
@@ -1,16 +1,24 @@
 import os
 import asyncio
-from tavily import TavilyClient
 from dotenv import load_dotenv
 import time
 
+from search_cache import acached_search
+import admission
+from metrics import record_phase
+from shared_cache import SHARED_CACHE
+from encoded_payloads import ENCODED_PAYLOADS
+from discover_feed import DiscoverFeed
+
 load_dotenv()
 
-tavily_client = TavilyClient(api_key=os.environ.get("TAVILY_API_KEY"))
+# Discover payloads live in the cross-worker shared cache under this namespace
+CACHE_NAMESPACE = "discover"
 
-# Cache to store discover content
-CACHE = {}
-CACHE_LOCK = asyncio.Lock()
+# In-flight fetches shared by the scheduler and request handlers: category -> asyncio.Task
+INFLIGHT = {}
+# Seconds a request waits on a cache-miss fetch before returning a pending response
+MISS_WAIT_TIMEOUT = float(os.environ.get("DISCOVER_MISS_WAIT_TIMEOUT", 8))
 
 CATEGORIES = [
     "for_you", "top", "tech_science", "finance", 
@@ -75,13 +83,13 @@ async def fetch_category_content(category: str):
     query = get_query_for_category(category)
     print(f"Background fetching discover content for category: {category}")
     try:
-        # Run the synchronous Tavily client in a thread pool
-        response = await asyncio.to_thread(
-            tavily_client.search,
+        # Always upstream: the scheduler's change-rate feedback must see real churn, not cache hits
+        response = await acached_search(
             query,
             topic="news",
             max_results=10,
-            include_images=True
+            include_images=True,
+            refresh=True
         )
         results = response.get("results", [])
         if results:
@@ -96,36 +104,182 @@ async def fetch_category_content(category: str):
         print(f"Error fetching discover content for {category}: {e}")
         return None
 
+async def _fetch_and_store(category: str, priority: int):
+    admission.set_priority(priority)
+    try:
+        data = await fetch_category_content(category)
+        previous = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+        if data:
+            await SHARED_CACHE.aset(CACHE_NAMESPACE, category, data)
+            ENCODED_PAYLOADS.prime(CACHE_NAMESPACE, category, data, data["last_updated"])
+            FEED.notify()
+        return previous, data
+    finally:
+        INFLIGHT.pop(category, None)
+
+def fetch_shared(category: str, priority: int = admission.BACKGROUND) -> asyncio.Task:
+    """
+    Starts a fetch for the category, or returns the one already in flight,
+    so the background scheduler and concurrent requests share one upstream call.
+    The task resolves to (previous cached payload, new payload or None).
+    """
+    task = INFLIGHT.get(category)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_store(category, priority))
+        INFLIGHT[category] = task
+    return task
+
+# ---------------------------------------------------------
+# Refresh Scheduler
+# ---------------------------------------------------------
+REFRESH_CONCURRENCY = int(os.environ.get("DISCOVER_REFRESH_CONCURRENCY", 3))
+BASE_INTERVAL = float(os.environ.get("DISCOVER_BASE_INTERVAL", 60))
+MIN_INTERVAL = float(os.environ.get("DISCOVER_MIN_INTERVAL", 30))
+MAX_INTERVAL = float(os.environ.get("DISCOVER_MAX_INTERVAL", 900))
+MAX_BACKOFF = float(os.environ.get("DISCOVER_MAX_BACKOFF", 1800))
+JITTER = 0.1  # +/- fraction applied to every delay
+
+def result_change_ratio(old: dict, new: dict) -> float:
+    """Fraction of result URLs that differ between two fetches (1.0 = all new)."""
+    old_urls = {r.get("url") for r in (old or {}).get("results", [])}
+    new_urls = {r.get("url") for r in new.get("results", [])}
+    union = old_urls | new_urls
+    if not union:
+        return 0.0
+    return 1 - len(old_urls & new_urls) / len(union)
+
+def jittered(delay: float) -> float:
+    return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+class RefreshScheduler:
+    """
+    Refreshes each category on its own timer, several at a time.
+
+    A category whose results change a lot between fetches is refreshed more
+    often; one that barely changes backs off towards MAX_INTERVAL. Failed
+    fetches are retried with exponential backoff instead of every cycle.
+    """
+
+    def __init__(self, categories, concurrency: int = REFRESH_CONCURRENCY):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.running = {}  # category -> asyncio.Task
+        now = time.time()
+        self.state = {
+            category: {
+                "interval": BASE_INTERVAL,
+                "next_run": now,
+                "last_run": None,
+                "last_duration": None,
+                "last_change": None,
+                "failures": 0,
+            }
+            for category in categories
+        }
+
+    def _record(self, category: str, previous: dict, data: dict, duration: float):
+        state = self.state[category]
+        now = time.time()
+        state["last_run"] = now
+        state["last_duration"] = duration
+
+        if data is None:
+            state["failures"] += 1
+            delay = min(MAX_BACKOFF, state["interval"] * 2 ** state["failures"])
+        else:
+            state["failures"] = 0
+            change = result_change_ratio(previous, data)
+            state["last_change"] = change
+            if change > 0.5:
+                state["interval"] = max(MIN_INTERVAL, state["interval"] / 2)
+            elif change < 0.2:
+                state["interval"] = min(MAX_INTERVAL, state["interval"] * 1.5)
+            delay = state["interval"]
+
+        state["next_run"] = now + jittered(delay)
+
+    async def refresh(self, category: str):
+        previous, data = None, None
+        start = time.perf_counter()
+        try:
+            async with self.semaphore:
+                start = time.perf_counter()
+                previous, data = await fetch_shared(category)
+        except Exception as e:
+            # Recorded as a failed fetch so it backs off instead of retrying every cycle
+            print(f"Discover refresh for {category} failed: {e}")
+        duration = time.perf_counter() - start
+
+        self._record(category, previous, data, duration)
+
+    def resume_from_cache(self):
+        """
+        Schedules categories from the shared cache's timestamps, so a new
+        leader (or a restart) doesn't refetch content another worker just stored.
+        """
+        for category, state in self.state.items():
+            cached = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+            if cached and cached.get("last_updated"):
+                state["last_run"] = cached["last_updated"]
+                state["next_run"] = cached["last_updated"] + jittered(state["interval"])
+
+    async def run(self):
+        self.resume_from_cache()
+        while True:
+            now = time.time()
+            for category, state in self.state.items():
+                if state["next_run"] <= now and category not in self.running:
+                    task = asyncio.create_task(self.refresh(category))
+                    self.running[category] = task
+                    task.add_done_callback(lambda _, c=category: self.running.pop(c, None))
+
+            pending = [s["next_run"] for c, s in self.state.items() if c not in self.running]
+            wake = min(pending, default=now + 1) - time.time()
+            await asyncio.sleep(min(max(wake, 0.5), 5))
+
+    def status(self):
+        now = time.time()
+        return {
+            category: {
+                **state,
+                "next_run_in": max(0.0, state["next_run"] - now),
+                "running": category in self.running,
+            }
+            for category, state in self.state.items()
+        }
+
+SCHEDULER = RefreshScheduler(CATEGORIES)
+# Pushes category changes to /api/discover/stream subscribers
+FEED = DiscoverFeed(CACHE_NAMESPACE, CATEGORIES)
+
 async def update_cache():
     """
-    Background task to update the cache every 60 seconds.
+    Background task that keeps the cache fresh via the refresh scheduler.
+    Run under LEADER so only the elected worker refreshes; the others serve the shared cache.
     """
-    while True:
-        print("Starting cache update cycle...")
-        for category in CATEGORIES:
-            data = await fetch_category_content(category)
-            if data:
-                async with CACHE_LOCK:
-                    CACHE[category] = data
-        
-        print("Cache update cycle complete. Sleeping for 60 seconds.")
-        await asyncio.sleep(60)
+    print("Starting discover refresh scheduler...")
+    await SCHEDULER.run()
 
 async def get_discover_content(category: str = "for_you"):
     """
     Fetches trending content for the Discover section.
     Returns cached content if available, otherwise triggers an immediate fetch.
     """
-    async with CACHE_LOCK:
-        if category in CACHE:
-            return CACHE[category]
-    
-    # If not in cache (e.g., startup), fetch immediately
+    cached = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+    if cached is not None:
+        return cached
+
+    # If not in cache (e.g., startup), join or start the shared fetch
     print(f"Cache miss for {category}, fetching immediately...")
-    data = await fetch_category_content(category)
+    started = time.perf_counter()
+    try:
+        _, data = await asyncio.wait_for(asyncio.shield(fetch_shared(category, admission.DASHBOARD)), MISS_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        # The fetch keeps running and fills the cache; the client can retry shortly
+        return {"results": [], "images": [], "pending": True}
+    finally:
+        record_phase("fetch", time.perf_counter() - started)
+
     if data:
-        async with CACHE_LOCK:
-            CACHE[category] = data
         return data
     
     return {"results": [], "images": [], "error": "Failed to fetch content"}
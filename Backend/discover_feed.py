@@ -0,0 +1,162 @@
+import os
+import asyncio
+
+from shared_cache import SHARED_CACHE
+from stream_encoder import sse_event
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# Idle subscribers get an SSE comment this often so proxies keep the connection open
+HEARTBEAT_INTERVAL = float(os.environ.get("DISCOVER_FEED_HEARTBEAT", 15))
+# Undelivered messages per subscriber before it is switched to a resync
+SUBSCRIBER_BUFFER = int(os.environ.get("DISCOVER_FEED_BUFFER", 16))
+# How often the shared cache is checked for categories written by another worker
+POLL_INTERVAL = float(os.environ.get("DISCOVER_FEED_POLL_INTERVAL", 1.0))
+
+MODES = ("diff", "full")
+
+
+def diff_results(old: dict, new: dict) -> dict:
+    """Results added and removed between two payloads, keyed by URL."""
+    old_urls = {r.get("url") for r in (old or {}).get("results", [])}
+    new_results = new.get("results", [])
+    new_urls = {r.get("url") for r in new_results}
+    return {
+        "added": [r for r in new_results if r.get("url") not in old_urls],
+        "removed": [url for url in old_urls if url not in new_urls],
+        "order": [r.get("url") for r in new_results],
+        "images": new.get("images", []),
+    }
+
+
+# ---------------------------------------------------------
+# Subscribers
+# ---------------------------------------------------------
+class Subscriber:
+    """
+    One open stream. Its queue is bounded: when a slow client falls
+    SUBSCRIBER_BUFFER messages behind, the backlog is dropped and the client
+    is sent full snapshots instead, so memory stays flat and nothing is lost.
+    """
+
+    def __init__(self, categories, mode: str, buffer: int = SUBSCRIBER_BUFFER):
+        self.categories = set(categories)
+        self.mode = mode
+        self.queue = asyncio.Queue(maxsize=buffer)
+        self.resyncs = 0
+
+    def offer(self, message: tuple):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.resyncs += 1
+            self.queue.put_nowait(("resync", None, None))
+
+
+class DiscoverFeed:
+    """
+    Fans out discover category changes to SSE subscribers.
+
+    Changes are detected by watching the shared cache, so subscribers on any
+    worker hear about refreshes done by the elected leader. A local write
+    calls `notify()` to skip the poll delay.
+    """
+
+    def __init__(self, namespace: str, categories, poll_interval: float = POLL_INTERVAL):
+        self.namespace = namespace
+        self.categories = list(categories)
+        self.poll_interval = poll_interval
+        self.subscribers = set()
+        self._seen = {}  # category -> last payload delivered
+        self._wake = asyncio.Event()
+        self._watcher = None
+
+        self.published = 0
+
+    def notify(self):
+        self._wake.set()
+
+    def subscribe(self, categories, mode: str = "diff") -> Subscriber:
+        subscriber = Subscriber([c for c in categories if c in self.categories], mode)
+        self.subscribers.add(subscriber)
+        if self._watcher is None or self._watcher.done():
+            self._seen = {c: SHARED_CACHE.get(self.namespace, c) for c in self.categories}
+            self._watcher = asyncio.create_task(self._watch())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def _check(self):
+        for category in self.categories:
+            current = SHARED_CACHE.get(self.namespace, category)
+            previous = self._seen.get(category)
+            if not current or current.get("last_updated") == (previous or {}).get("last_updated"):
+                continue
+            self._seen[category] = current
+            self.published += 1
+            for subscriber in self.subscribers:
+                if category in subscriber.categories:
+                    subscriber.offer(("change", category, (previous, current)))
+
+    async def _watch(self):
+        # Runs only while someone is subscribed
+        while self.subscribers:
+            try:
+                self._check()
+            except Exception as e:
+                print(f"Discover feed check failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def snapshot(self, category: str):
+        return SHARED_CACHE.get(self.namespace, category)
+
+    async def stream(self, subscriber: Subscriber, send_snapshot: bool = True):
+        """Yields SSE text for one subscriber until the client goes away."""
+        try:
+            if send_snapshot:
+                for category in sorted(subscriber.categories):
+                    payload = self.snapshot(category)
+                    if payload:
+                        yield sse_event("snapshot", {"category": category, **payload})
+
+            while True:
+                try:
+                    kind, category, change = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                if kind == "resync":
+                    for category in sorted(subscriber.categories):
+                        payload = self.snapshot(category)
+                        if payload:
+                            yield sse_event("snapshot", {"category": category, **payload})
+                    continue
+
+                previous, current = change
+                if subscriber.mode == "full":
+                    yield sse_event("update", {"category": category, **current})
+                else:
+                    yield sse_event("diff", {
+                        "category": category,
+                        "last_updated": current.get("last_updated"),
+                        **diff_results(previous, current),
+                    })
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "resyncs": sum(s.resyncs for s in self.subscribers),
+            "watching": self._watcher is not None and not self._watcher.done(),
+        }
@@ -0,0 +1,172 @@
+import os
+import gzip
+import hashlib
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+from stream_encoder import dumps
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+ENCODED_MAX_ENTRIES = int(os.environ.get("ENCODED_PAYLOAD_MAX_ENTRIES", 128))
+GZIP_LEVEL = int(os.environ.get("ENCODED_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("ENCODED_BROTLI_QUALITY", 5))
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = int(os.environ.get("ENCODED_MIN_COMPRESS_BYTES", 512))
+
+# Preferred first when the client accepts several
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def parse_fields(fields: str):
+    """`fields=title,url,content` -> ("content", "title", "url"); None keeps everything."""
+    if not fields:
+        return None
+    return tuple(sorted({f.strip() for f in fields.split(",") if f.strip()})) or None
+
+
+def project(payload: dict, fields) -> dict:
+    """
+    Keeps only `fields` in every item of the payload's result lists, so list
+    views can skip heavy keys like `raw_content`. Top-level scalars are kept.
+    """
+    if not fields:
+        return payload
+    keep = set(fields)
+    projected = {}
+    for key, value in payload.items():
+        if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+            value = [{k: v for k, v in item.items() if k in keep} if isinstance(item, dict) else item for item in value]
+        projected[key] = value
+    return projected
+
+
+# ---------------------------------------------------------
+# Encoded Payload
+# ---------------------------------------------------------
+class EncodedPayload:
+    """One response body serialized once, with its compressed variants and ETag."""
+
+    __slots__ = ("body", "etag", "encoded")
+
+    def __init__(self, payload: dict):
+        self.body = dumps(payload).encode()
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+        self.encoded = {}  # content-coding -> bytes
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            self.encoded["gzip"] = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+
+    def pick(self, accept_encoding: str):
+        """Best (content-coding, bytes) for an Accept-Encoding header."""
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            coding, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(coding.strip().lower())
+        for coding in ENCODINGS:
+            if coding in self.encoded and (coding in accepted or "*" in accepted):
+                return coding, self.encoded[coding]
+        return None, self.body
+
+
+# ---------------------------------------------------------
+# Store
+# ---------------------------------------------------------
+class EncodedPayloads:
+    """
+    Per-worker LRU of encoded dashboard payloads, keyed on the cached entry
+    and its version (its `last_updated`), so each update is serialized and
+    compressed once and every request after that is served from bytes.
+    """
+
+    def __init__(self, max_entries: int = ENCODED_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (namespace, key, version, fields) -> EncodedPayload
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+
+    def get(self, namespace: str, key: str, payload: dict, version=None, fields=None) -> EncodedPayload:
+        """
+        Encoded `payload` (projected to `fields`). With `version` None the
+        payload is transient (e.g. a pending placeholder) and is not kept.
+        """
+        if version is None:
+            return EncodedPayload(project(payload, fields))
+        cache_key = (namespace, key, version, fields)
+        encoded = self._entries.get(cache_key)
+        if encoded is not None:
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return encoded
+
+        self.misses += 1
+        encoded = EncodedPayload(project(payload, fields))
+        # Older versions of the same entry can never be asked for again
+        for stale in [k for k in self._entries if k[:2] == (namespace, key) and k[2] != version]:
+            del self._entries[stale]
+        self._entries[cache_key] = encoded
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return encoded
+
+    def prime(self, namespace: str, key: str, payload: dict, version):
+        """Encodes a freshly stored payload ahead of the first request for it."""
+        self.get(namespace, key, payload, version)
+
+    def response(self, request: Request, encoded: EncodedPayload, headers: dict = None) -> Response:
+        """
+        304 when the client already holds this version, otherwise the
+        pre-compressed bytes for its Accept-Encoding.
+        """
+        headers = {
+            **(headers or {}),
+            "ETag": encoded.etag,
+            "Vary": "Accept-Encoding",
+            # Clients may keep the body but must revalidate before reuse
+            "Cache-Control": "no-cache",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            if encoded.etag in tags or "*" in tags:
+                self.not_modified += 1
+                return Response(status_code=304, headers=headers)
+
+        coding, body = encoded.pick(request.headers.get("accept-encoding"))
+        if coding:
+            headers["Content-Encoding"] = coding
+        self.bytes_raw += len(encoded.body)
+        self.bytes_sent += len(body)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "encodings": list(ENCODINGS),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "bytes_raw": self.bytes_raw,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+ENCODED_PAYLOADS = EncodedPayloads()
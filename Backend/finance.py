@@ -1,20 +1,40 @@
 import os
-from fastapi import APIRouter, HTTPException
-from tavily import TavilyClient
+from fastapi import APIRouter, HTTPException, Request
+from typing import Optional
 from dotenv import load_dotenv
 import asyncio
+import time
+
+from search_cache import acached_search
+import admission
+from metrics import start_timing
+from shared_cache import SHARED_CACHE
+from encoded_payloads import ENCODED_PAYLOADS, parse_fields
+from market_data import MARKET_DATA
 
 load_dotenv()
 
 router = APIRouter()
-tavily_client = TavilyClient(api_key=os.environ.get("TAVILY_API_KEY"))
+
+FINANCE_CATEGORIES = ["us_markets", "crypto", "earnings", "screener", "politicians"]
+
+# Seconds a dashboard payload is served without triggering a background refresh
+FRESHNESS_WINDOW = float(os.environ.get("FINANCE_FRESHNESS_WINDOW", 120))
+
+# Stale-while-revalidate cache shared by all workers: category -> payload (with "last_updated")
+CACHE_NAMESPACE = "finance"
+# A worker refreshing a category holds this lease; the others keep serving the cached payload
+REFRESH_LEASE = float(os.environ.get("FINANCE_REFRESH_LEASE", 60))
+# How often a worker without the lease checks for the holder's payload on a cold start
+LEASE_POLL_INTERVAL = float(os.environ.get("FINANCE_LEASE_POLL_INTERVAL", 0.5))
+# In-flight refreshes in this worker: category -> asyncio.Task
+REFRESHING = {}
 
 async def fetch_tavily(query: str, topic: str = "general"):
     try:
-        # Run in a thread pool since TavilyClient is synchronous
-        return await asyncio.to_thread(
-            tavily_client.search,
-            query=query,
+        # Shared cache and pooled client with chat and discover
+        return await acached_search(
+            query,
             topic=topic,
             max_results=5,
             include_images=True
@@ -23,8 +43,7 @@ async def fetch_tavily(query: str, topic: str = "general"):
         print(f"Error fetching {query}: {e}")
         return None
 
-@router.get("/api/finance")
-async def get_finance_dashboard(category: str = "us_markets"):
+async def build_finance_payload(category: str = "us_markets"):
     """
     Aggregates data for the Finance dashboard based on category.
     """
@@ -217,3 +236,114 @@ async def get_finance_dashboard(category: str = "us_markets"):
             "gainers": gainers_data.get("results", []) if gainers_data else [],
             "type": "standard"
         }
+
+
+def has_results(payload: dict) -> bool:
+    return any(payload.get(k) for k in ("indices", "market_summary", "gainers", "screener_results"))
+
+def is_fresh(payload: dict) -> bool:
+    return payload is not None and time.time() - payload["last_updated"] <= FRESHNESS_WINDOW
+
+def encoded_payload(category: str, payload: dict, fields=None):
+    """The response body for a cached payload, serialized once per update and staleness."""
+    stale = not is_fresh(payload)
+    return ENCODED_PAYLOADS.get(
+        CACHE_NAMESPACE, category, {**payload, "stale": stale}, (payload["last_updated"], stale), fields
+    )
+
+async def _refresh_category(category: str, priority: int):
+    admission.set_priority(priority)
+    lease = f"{CACHE_NAMESPACE}:{category}"
+    try:
+        cached = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+        while not await SHARED_CACHE.aclaim(lease, REFRESH_LEASE):
+            if cached is not None:
+                # Another worker is already refreshing this category
+                return cached
+            # Cold start: wait for the lease holder's payload rather than fetching it too.
+            # If the holder dies, its lease expires and the next claim takes over.
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+            cached = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+
+        try:
+            cached = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+            if is_fresh(cached):
+                # The previous holder finished while we were waiting for the lease
+                return cached
+            payload = await build_finance_payload(category)
+            if not has_results(payload) and cached is not None:
+                # Every upstream call failed; keep serving the previous payload
+                print(f"Finance refresh for {category} returned nothing, keeping cached payload")
+                return cached
+            # An empty first payload is marked stale right away so the next request retries
+            payload["last_updated"] = time.time() if has_results(payload) else 0
+            await SHARED_CACHE.aset(CACHE_NAMESPACE, category, payload)
+        finally:
+            # Only after the write, so no other worker claims the lease and refetches in between
+            await SHARED_CACHE.arelease(lease)
+        encoded_payload(category, payload)
+        MARKET_DATA.ingest(category, payload)
+        return payload
+    finally:
+        REFRESHING.pop(category, None)
+
+def refresh_category(category: str, priority: int = admission.BACKGROUND) -> asyncio.Task:
+    """Starts a refresh for the category, or returns the one already running."""
+    task = REFRESHING.get(category)
+    if task is None:
+        task = asyncio.create_task(_refresh_category(category, priority))
+        REFRESHING[category] = task
+    return task
+
+async def prewarm_finance():
+    """
+    Background task to fill the cache for every category at startup.
+    Runs in the elected leader only; categories a previous run already has
+    fresh are skipped.
+    """
+    print("Prewarming finance dashboard cache...")
+    stale = [c for c in FINANCE_CATEGORIES if not is_fresh(SHARED_CACHE.get(CACHE_NAMESPACE, c))]
+    await asyncio.gather(
+        *(refresh_category(category) for category in stale),
+        return_exceptions=True
+    )
+    print("Finance dashboard cache prewarmed.")
+
+@router.get("/api/finance")
+async def get_finance_dashboard(request: Request, category: str = "us_markets", fields: Optional[str] = None):
+    """
+    Serves the cached dashboard payload for a category.
+    Stale payloads are returned immediately and refreshed in the background;
+    only a category with nothing cached waits on upstream.
+    `fields` (e.g. "title,url,content") trims every list item to those keys.
+    """
+    if category not in FINANCE_CATEGORIES:
+        category = "us_markets"
+
+    timing = start_timing()
+    payload = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+    if payload is None:
+        with timing.phase("refresh"):
+            payload = await asyncio.shield(refresh_category(category, admission.DASHBOARD))
+    elif not is_fresh(payload):
+        refresh_category(category)
+    # Payloads refreshed by another worker feed this worker's quote history too
+    MARKET_DATA.ingest(category, payload)
+
+    encoded = encoded_payload(category, payload, parse_fields(fields))
+    return ENCODED_PAYLOADS.response(request, encoded, {"Server-Timing": timing.header()})
+
+@router.get("/api/finance/quotes")
+async def get_finance_quotes(symbols: Optional[str] = None, points: Optional[int] = None):
+    """
+    Latest price and percent change per symbol with its sparkline history,
+    parsed from the cached dashboard payloads. Never calls upstream.
+    `symbols` is a comma-separated filter; `points` caps each sparkline.
+    """
+    for category in FINANCE_CATEGORIES:
+        payload = SHARED_CACHE.get(CACHE_NAMESPACE, category)
+        if payload is not None:
+            MARKET_DATA.ingest(category, payload)
+
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else None
+    return {"quotes": MARKET_DATA.quotes(wanted, points)}
@@ -1,13 +1,33 @@
-from fastapi import FastAPI, HTTPException
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-from typing import List
-import json
+from typing import List, Optional
+import uuid
 import asyncio
 from langchain_core.messages import HumanMessage, AIMessage
-from agent import create_graph
+from agent import create_graph, load_llm
 import finance
+from search_cache import SEARCH_CACHE
+from search_client import SEARCH_CLIENT
+from conversations import CONVERSATIONS
+import admission
+from article_index import ARTICLE_INDEX
+from shared_cache import SHARED_CACHE, LEADER
+from market_data import MARKET_DATA
+from speculation import SpeculativeSearch, SPECULATIVE_SEARCH
+from chat_stream import agent_records
+from batch_chat import run_batch, ndjson_lines, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, BATCH_MAX_QUESTIONS
+from answer_cache import ANSWER_CACHE, answer_text
+from stream_encoder import StreamEncoder, encode_stream
+from encoded_payloads import ENCODED_PAYLOADS, parse_fields
+import run_control
+from run_control import run_config, watch_disconnect, CHAT_DEADLINE
+from metrics import METRICS, CHAT_LIMIT_HITS, ChatTimer, gauges, start_timing
+from startup import WARMUP, BACKGROUND_DELAY
 
 app = FastAPI(title="Perplexity")
 app.include_router(finance.router)
@@ -19,10 +39,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Conversation-ID", "Server-Timing"],
 )
 
-# Initialize the graph
-agent_app = create_graph()
+# The graph is compiled by the warmup, once the SQLite checkpointer is open
+agent_app = None
+
+async def get_agent_app():
+    """The chat graph, once the warmup has built it and the model client."""
+    await WARMUP.wait("graph")
+    # A failed model setup (e.g. no key) is retried, and reported, by the run itself
+    await WARMUP.wait("llm", raise_on_failure=False)
+    return agent_app
 
 class Message(BaseModel):
     role: str
@@ -30,75 +58,279 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[Message]
+    conversation_id: Optional[str] = None
+    # Search the raw question while the model plans; defaults to SPECULATIVE_SEARCH
+    speculative: Optional[bool] = None
+    # Seconds the answer may take, capped at CHAT_DEADLINE
+    deadline: Optional[float] = None
 
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
-    async def event_generator():
+async def chat_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    x_conversation_id: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+):
+    # Each conversation gets its own graph thread; without an ID the chat starts fresh
+    thread_id = request.conversation_id or x_conversation_id or uuid.uuid4().hex
+    # Only first-turn, context-free questions can share a cached answer
+    cacheable = len(request.messages) == 1 and not (request.conversation_id or x_conversation_id)
+    # Clients may ask for a tighter deadline, never a longer one
+    deadline = min(request.deadline or CHAT_DEADLINE, CHAT_DEADLINE)
+
+    # Clients asking for text/event-stream get SSE instead of the line protocol
+    encoder = StreamEncoder("sse" if accept and "text/event-stream" in accept else "lines")
+
+    async def answer_records(question: str, config: dict, timer: ChatTimer):
+        cached = ANSWER_CACHE.get(question) if cacheable else None
+        if cached is not None:
+            for record in cached:
+                yield record
+            # Seed the thread so follow-ups in this conversation keep the context
+            await agent_app.aupdate_state(
+                config,
+                {"messages": [HumanMessage(content=question), AIMessage(content=answer_text(cached))]},
+                as_node="agent",
+            )
+            return
+
+        speculative = None
+        if SPECULATIVE_SEARCH if request.speculative is None else request.speculative:
+            speculative = SpeculativeSearch(question)
+            config["configurable"]["speculative_search"] = speculative
+
+        records = []
+        async for kind, payload in agent_records(agent_app, question, config, speculative, timer):
+            records.append((kind, payload))
+            yield kind, payload
+
+        if cacheable:
+            ANSWER_CACHE.put(question, records)
+
+    async def chat_records():
+        # We'll use the last message as the input
+        if not request.messages:
+            return
+
+        question = request.messages[-1].content
+        config = run_config(thread_id, deadline)
+        timer = ChatTimer()
+        outcome = "failed"
+        run_control.RUN_COUNTS["started"] += 1
         try:
-            # We'll use the last message as the input
-            if not request.messages:
-                return
-
-            latest_message = request.messages[-1]
-            input_message = HumanMessage(content=latest_message.content)
-            
-            # Use a static thread_id for session state
-            config = {"configurable": {"thread_id": "1"}}
-            
-            async for event in agent_app.astream_events(
-                {"messages": [input_message]},
-                config=config,
-                version="v1"
-            ):
-                kind = event["event"]
-                
-                # Stream Text Tokens
-                if kind == "on_chat_model_stream":
-                    content = event["data"]["chunk"].content
-                    if content:
-                        # Protocol Type 0: Text
-                        yield f"0:{json.dumps(content)}\n"
-                
-                # Stream Tool Output (Sources & Images)
-                elif kind == "on_tool_end":
-                    output = event["data"].get("output")
-                    
-                    tool_result = None
-                    if hasattr(output, "content"):
-                        try:
-                            tool_result = json.loads(output.content)
-                        except:
-                            pass
-                    elif isinstance(output, dict) and "results" in output:
-                         tool_result = output
-                    
-                    if tool_result:
-                        # Stream Images
-                        if "images" in tool_result and tool_result["images"]:
-                            yield f"3:{json.dumps(tool_result['images'])}\n"
-                        
-                        # Stream Sources
-                        if "results" in tool_result and tool_result["results"]:
-                            yield f"2:{json.dumps(tool_result['results'])}\n"
-                
+            # Requests arriving during warmup wait here for the graph and the model
+            await get_agent_app()
+            await CONVERSATIONS.touch(thread_id)
 
+            # A closed browser or a blown deadline cancels the graph run and its upstream calls
+            async with watch_disconnect(http_request), asyncio.timeout(deadline):
+                async for record in answer_records(question, config, timer):
+                    timer.on_record(record[0])
+                    yield record
+            outcome = "completed"
 
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except TimeoutError:
+            outcome = "timed_out"
+            CHAT_LIMIT_HITS.inc(limit="deadline")
+            yield "error", f"Error: no answer within {deadline:g} seconds"
         except Exception as e:
             print(f"Error generating stream: {e}")
-            yield f"0:{json.dumps(f'Error: {str(e)}')}\n"
+            yield "error", f"Error: {str(e)}"
+        finally:
+            run_control.RUN_COUNTS[outcome] += 1
+            timer.finish(outcome)
+            try:
+                await CONVERSATIONS.prune(thread_id)
+            except Exception as e:
+                print(f"Error pruning conversation {thread_id}: {e}")
+
+    async def event_generator():
+        # Set before the encoder starts the records task so it inherits the priority
+        admission.set_priority(admission.INTERACTIVE)
+        async for chunk in encode_stream(chat_records(), encoder):
+            yield chunk
+
+    return StreamingResponse(
+        event_generator(),
+        media_type=encoder.media_type,
+        headers={"X-Conversation-ID": thread_id},
+    )
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    concurrency: Optional[int] = None
+    # Seconds each question may take, capped at CHAT_DEADLINE
+    deadline: Optional[float] = None
+
+@app.post("/api/chat/batch")
+async def batch_chat_endpoint(request: BatchChatRequest):
+    """
+    Answers many independent questions at once and streams one NDJSON line per
+    answer as it completes, then a summary line. Searches for near-identical
+    questions in the batch are made only once.
+    """
+    questions = [q for q in request.questions if q.strip()]
+    if not questions:
+        raise HTTPException(status_code=400, detail="no questions given")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"at most {BATCH_MAX_QUESTIONS} questions per batch")
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    deadline = min(request.deadline or CHAT_DEADLINE, CHAT_DEADLINE)
+
+    await get_agent_app()
+    # One-shot threads: an in-memory graph keeps them out of the conversation store
+    items = run_batch(create_graph(), questions, concurrency, deadline)
+    return StreamingResponse(ndjson_lines(items), media_type="application/x-ndjson")
 
-    return StreamingResponse(event_generator(), media_type="text/plain")
+@app.get("/api/chat/stats")
+async def chat_stats_endpoint():
+    return run_control.stats()
 
-from discover import get_discover_content, update_cache
+@app.get("/api/answers/stats")
+async def answer_cache_stats_endpoint():
+    return ANSWER_CACHE.stats()
+
+@app.delete("/api/answers")
+async def answer_cache_invalidate_endpoint(question: Optional[str] = None):
+    """Drops the cached answer for one question, or every cached answer."""
+    return {"invalidated": ANSWER_CACHE.invalidate(question)}
+
+from discover import get_discover_content, update_cache, SCHEDULER, FEED, CACHE_NAMESPACE as DISCOVER_NAMESPACE
+from discover_feed import MODES as FEED_MODES
+
+# ---------------------------------------------------------
+# Startup
+# ---------------------------------------------------------
+async def build_graph():
+    global agent_app
+    agent_app = create_graph(CONVERSATIONS.saver)
+
+async def lead_refreshes():
+    # Only the elected worker refreshes upstream content; the others serve the shared cache
+    await asyncio.gather(update_cache(), finance.prewarm_finance())
+
+async def start_background():
+    # Refresh loops start last and a little late, so the first requests get the upstream quota
+    await asyncio.sleep(BACKGROUND_DELAY)
+    asyncio.create_task(CONVERSATIONS.run_maintenance())
+    asyncio.create_task(LEADER.run(lead_refreshes))
+    asyncio.create_task(MARKET_DATA.run_snapshots())
+
+WARMUP.add("conversations", CONVERSATIONS.open)
+WARMUP.add("graph", build_graph)
+# Imports the Gemini SDK in a thread; a missing key leaves chat failing, not the process
+WARMUP.add("llm", load_llm, required=False)
+WARMUP.add("shared_cache", SHARED_CACHE.stats)
+WARMUP.add("market_data", MARKET_DATA.load, required=False)
+# Only sleeps and starts loops, so /readyz doesn't wait for it
+WARMUP.add("background", start_background, required=False)
+WARMUP.imported(IMPORT_STARTED)
 
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(update_cache())
+    # Nothing heavy here: the server starts accepting requests right away
+    asyncio.create_task(WARMUP.run())
+
+@app.get("/healthz")
+async def healthz_endpoint():
+    """Liveness: the process is up and its event loop is responsive."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz_endpoint():
+    """Readiness: 200 once every required warmup stage is done, 503 until then."""
+    status = WARMUP.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await CONVERSATIONS.close()
+    await SEARCH_CLIENT.aclose()
+    ARTICLE_INDEX.close()
+    if MARKET_DATA.snapshot_path:
+        MARKET_DATA.save()
+    LEADER.release()
+    SHARED_CACHE.close()
 
 @app.get("/api/discover")
-async def discover_endpoint(category: str = "for_you"):
+async def discover_endpoint(request: Request, category: str = "for_you", fields: Optional[str] = None):
+    """
+    Cached discover content, with an ETag for If-None-Match revalidation and
+    pre-compressed bodies. `fields` trims each result to the listed keys.
+    """
+    timing = start_timing()
     data = await get_discover_content(category)
-    return data
+    # Pending and error placeholders carry no last_updated and are not kept encoded
+    encoded = ENCODED_PAYLOADS.get(DISCOVER_NAMESPACE, category, data, data.get("last_updated"), parse_fields(fields))
+    return ENCODED_PAYLOADS.response(request, encoded, {"Server-Timing": timing.header()})
+
+@app.get("/api/discover/stream")
+async def discover_stream_endpoint(categories: str = "for_you", mode: str = "diff", snapshot: bool = True):
+    """
+    Server-sent events for the given comma-separated categories: a snapshot
+    of each on connect, then a "diff" (or "update" in full mode) whenever the
+    refresh loop stores new content.
+    """
+    if mode not in FEED_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(FEED_MODES)}")
+    subscriber = FEED.subscribe(categories.split(","), mode)
+    if not subscriber.categories:
+        FEED.unsubscribe(subscriber)
+        raise HTTPException(status_code=400, detail="no known categories requested")
+    return StreamingResponse(
+        FEED.stream(subscriber, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/discover/schedule")
+async def discover_schedule_endpoint():
+    return SCHEDULER.status()
+
+@app.get("/api/articles/search")
+async def article_search_endpoint(q: str, limit: int = 10, max_age: Optional[float] = None, topic: Optional[str] = None):
+    results = await asyncio.to_thread(ARTICLE_INDEX.search, q, limit, max_age, topic)
+    return {"results": results}
+
+@app.get("/api/upstream/stats")
+async def upstream_stats_endpoint():
+    return {"search": SEARCH_CLIENT.stats(), "admission": admission.stats()}
+
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    return {
+        "search": SEARCH_CACHE.stats(),
+        "conversations": CONVERSATIONS.stats(),
+        "articles": await asyncio.to_thread(ARTICLE_INDEX.stats),
+        "shared": SHARED_CACHE.stats(),
+        "leader": LEADER.status(),
+        "encoded": ENCODED_PAYLOADS.stats(),
+        "market_data": MARKET_DATA.stats(),
+    }
+
+# Existing component stats, exported on every /metrics scrape
+METRICS.register(lambda: gauges("search_cache", SEARCH_CACHE.stats()))
+METRICS.register(lambda: gauges("answer_cache", ANSWER_CACHE.stats()))
+METRICS.register(lambda: gauges("conversations", CONVERSATIONS.stats()))
+METRICS.register(lambda: gauges("articles", ARTICLE_INDEX.stats()))
+METRICS.register(lambda: gauges("shared_cache", SHARED_CACHE.stats()))
+METRICS.register(lambda: gauges("leader", LEADER.status()))
+METRICS.register(lambda: gauges("discover_feed", FEED.stats()))
+METRICS.register(lambda: gauges("encoded_payloads", ENCODED_PAYLOADS.stats()))
+METRICS.register(lambda: gauges("market_data", MARKET_DATA.stats()))
+METRICS.register(lambda: gauges("startup", WARMUP.stats()))
+METRICS.register(lambda: gauges("search_client", SEARCH_CLIENT.stats()))
+METRICS.register(lambda: gauges("chat_runs", run_control.stats()))
+METRICS.register(admission.metric_lines)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Rendering touches SQLite for the article count, so keep it off the event loop
+    body = await asyncio.to_thread(METRICS.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
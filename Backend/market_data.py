@@ -0,0 +1,362 @@
+import os
+import re
+import math
+import time
+import json
+import base64
+import asyncio
+from array import array
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# A new price further than this fraction from the previous sample is treated as a misparse
+MAX_PRICE_JUMP = float(os.environ.get("MARKET_MAX_PRICE_JUMP", 0.5))
+# ...unless this many samples in a row disagree, in which case the history follows them
+MAX_REJECTED = int(os.environ.get("MARKET_MAX_REJECTED", 3))
+# Points kept per symbol; older ones are overwritten
+HISTORY_POINTS = int(os.environ.get("MARKET_HISTORY_POINTS", 288))
+MAX_SYMBOLS = int(os.environ.get("MARKET_MAX_SYMBOLS", 500))
+# History is written here every MARKET_SNAPSHOT_INTERVAL seconds; empty disables snapshots
+SNAPSHOT_PATH = os.environ.get("MARKET_SNAPSHOT_PATH", "")
+SNAPSHOT_INTERVAL = float(os.environ.get("MARKET_SNAPSHOT_INTERVAL", 300))
+
+# Finance payload lists scanned for quotes
+QUOTE_LISTS = ("indices", "market_summary", "gainers", "screener_results")
+
+# Well-known names that are written out in prose rather than as tickers
+KNOWN_SYMBOLS = {
+    "SPX": ("S&P 500", r"S&P\s?500|SPX"),
+    "IXIC": ("Nasdaq Composite", r"Nasdaq(?: Composite)?(?!\s*:|[- ]100)"),
+    "NDX": ("Nasdaq 100", r"Nasdaq[- ]100"),
+    "DJI": ("Dow Jones Industrial Average", r"Dow Jones(?: Industrial Average)?|DJIA|the Dow"),
+    "VIX": ("CBOE Volatility Index", r"VIX|CBOE Volatility Index"),
+    "RUT": ("Russell 2000", r"Russell 2000"),
+    "BTC": ("Bitcoin", r"Bitcoin|BTC"),
+    "ETH": ("Ethereum", r"Ethereum|ETH"),
+    "SOL": ("Solana", r"Solana|SOL"),
+    "XRP": ("XRP", r"XRP"),
+    "DOGE": ("Dogecoin", r"Dogecoin|DOGE"),
+}
+
+KNOWN_RE = re.compile(
+    "|".join(rf"(?P<{symbol}>\b(?:{pattern})\b)" for symbol, (_, pattern) in KNOWN_SYMBOLS.items())
+)
+# "(NVDA)", "(NASDAQ: NVDA)", "NYSE: V", "$TSLA"
+TICKER_RE = re.compile(
+    r"\((?:(?:NASDAQ|NYSE|AMEX|NYSEARCA)\s*:\s*)?(?P<paren>[A-Z]{1,5})\)"
+    r"|\b(?:NASDAQ|NYSE|AMEX|NYSEARCA)\s*:\s*(?P<exchange>[A-Z]{1,5})\b"
+    r"|(?<![\w$])\$(?P<cashtag>[A-Z]{2,5})\b"
+)
+# Parenthesized abbreviations that are not tickers
+NOT_TICKERS = {"AI", "CEO", "CFO", "CPI", "EPS", "ETF", "EU", "GDP", "IPO", "UK", "US", "USA", "USD", "YTD", "FED", "SEC"}
+# Numbers that belong to an index's name, not to a price
+INDEX_NAME_RE = re.compile(
+    r"S&P\s?500|Nasdaq[- ]100|Russell\s?2000|FTSE\s?100|Nikkei\s?225|DAX\s?40|Stoxx\s?600|Euro\s?Stoxx\s?50",
+    re.I,
+)
+# A price needs a "$", thousands separators or decimals: bare integers are
+# usually counts, ranks or index names ("3rd session", "5 straight days")
+PRICE_RE = re.compile(
+    r"(?<![\w.,$])(?P<dollar>\$)?\s?(?P<value>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(?!\d|[,.]\d|[A-Za-z])"
+    r"(?!\s*(?:%|percent|points?|pts|billion|million|trillion|[BMTK]\b|x\b))"
+)
+CHANGE_RE = re.compile(r"(?P<sign>[+\-−–])?\s?(?P<value>\d+(?:\.\d+)?)\s?%")
+DOWN_RE = re.compile(r"\b(?:down|fell|falls|fall|lost|loses|declin\w*|dropp?\w*|slid|slips?|lower|sank)\b", re.I)
+# Prices are looked for this far after the mention, without crossing a sentence end
+WINDOW_CHARS = 120
+SENTENCE_END_RE = re.compile(r"[.;!?](?:\s|$)")
+
+
+def _window(text: str, start: int, stop: int = None) -> str:
+    """Text after a mention, up to the sentence end or the next mention, with index names blanked."""
+    window = text[start:min(start + WINDOW_CHARS, stop or len(text))]
+    end = SENTENCE_END_RE.search(window)
+    if end:
+        window = window[:end.start()]
+    return INDEX_NAME_RE.sub(lambda m: " " * len(m.group(0)), window)
+
+
+def _parse_values(window: str):
+    """(price, change_percent) found in the text following a symbol; either may be None."""
+    price = None
+    for match in PRICE_RE.finditer(window):
+        raw = match.group("value")
+        if not (match.group("dollar") or "," in raw or "." in raw):
+            continue
+        value = float(raw.replace(",", ""))
+        if value > 0:
+            price = value
+            break
+
+    change = None
+    match = CHANGE_RE.search(window)
+    if match:
+        change = float(match.group("value"))
+        sign = match.group("sign")
+        if sign and sign != "+":
+            change = -change
+        elif not sign and DOWN_RE.search(window[:match.start()]):
+            change = -change
+    return price, change
+
+
+def extract_quotes(results) -> dict:
+    """
+    Parses symbol / price / percent-change tuples out of search results.
+    Returns {symbol: {"name", "price", "change_percent", "source"}}, first
+    (most relevant) mention of each symbol wins.
+    """
+    quotes = {}
+    for result in results or []:
+        text = f"{result.get('title') or ''}. {result.get('content') or ''}"
+        mentions = []  # (start, end, symbol, name)
+        for match in KNOWN_RE.finditer(text):
+            mentions.append((match.start(), match.end(), match.lastgroup, KNOWN_SYMBOLS[match.lastgroup][0]))
+        for match in TICKER_RE.finditer(text):
+            symbol = match.group("paren") or match.group("exchange") or match.group("cashtag")
+            if symbol in NOT_TICKERS:
+                continue
+            name = KNOWN_SYMBOLS.get(symbol, (symbol,))[0]
+            mentions.append((match.start(), match.end(), symbol, name))
+        mentions.sort()
+
+        for i, (_, end, symbol, name) in enumerate(mentions):
+            if symbol in quotes:
+                continue
+            # "Nvidia (NVDA)" is one mention; otherwise a value after the next symbol belongs to that one
+            following = [m[0] for m in mentions[i + 1:] if m[0] >= end and m[2] != symbol]
+            price, change = _parse_values(_window(text, end, following[0] if following else None))
+            if price is None:
+                continue
+            quotes[symbol] = {"name": name, "price": price, "change_percent": change, "source": result.get("url")}
+    return quotes
+
+
+# ---------------------------------------------------------
+# History
+# ---------------------------------------------------------
+class SymbolHistory:
+    """
+    Fixed-size ring buffer of (time, price, change) points for one symbol,
+    stored in flat `array('d')` columns so memory per symbol never grows.
+    A missing change is stored as NaN.
+    """
+
+    __slots__ = ("symbol", "name", "source", "times", "prices", "changes", "_next", "count", "rejected")
+
+    def __init__(self, symbol: str, name: str, capacity: int = HISTORY_POINTS):
+        self.symbol = symbol
+        self.name = name
+        self.source = None
+        self.times = array("d", bytes(8 * capacity))
+        self.prices = array("d", bytes(8 * capacity))
+        self.changes = array("d", bytes(8 * capacity))
+        self._next = 0
+        self.count = 0
+        self.rejected = 0  # implausible samples in a row
+
+    @property
+    def capacity(self) -> int:
+        return len(self.times)
+
+    @property
+    def last_time(self) -> float:
+        return self.times[(self._next - 1) % self.capacity] if self.count else 0.0
+
+    def plausible(self, price: float, max_jump: float = MAX_PRICE_JUMP) -> bool:
+        """False when `price` is far from the last sample, i.e. most likely a misparse."""
+        if not self.count:
+            return True
+        last = self.prices[(self._next - 1) % self.capacity]
+        return abs(price - last) <= max_jump * last
+
+    def append(self, at: float, price: float, change: float = None):
+        i = self._next
+        self.times[i] = at
+        self.prices[i] = price
+        self.changes[i] = math.nan if change is None else change
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _order(self, last: int = None):
+        n = self.count if last is None else min(last, self.count)
+        start = (self._next - n) % self.capacity
+        return [(start + k) % self.capacity for k in range(n)]
+
+    def points(self, last: int = None):
+        """Oldest-first (times, prices) of the newest `last` points."""
+        order = self._order(last)
+        return [self.times[i] for i in order], [self.prices[i] for i in order]
+
+    def latest(self):
+        i = (self._next - 1) % self.capacity
+        change = self.changes[i]
+        return self.times[i], self.prices[i], None if math.isnan(change) else change
+
+    def to_snapshot(self) -> dict:
+        order = self._order()
+        return {
+            "name": self.name,
+            "source": self.source,
+            # Raw doubles, base64: compact and exact
+            "times": base64.b64encode(array("d", (self.times[i] for i in order)).tobytes()).decode(),
+            "prices": base64.b64encode(array("d", (self.prices[i] for i in order)).tobytes()).decode(),
+            "changes": base64.b64encode(array("d", (self.changes[i] for i in order)).tobytes()).decode(),
+        }
+
+    @classmethod
+    def from_snapshot(cls, symbol: str, data: dict, capacity: int = HISTORY_POINTS):
+        history = cls(symbol, data.get("name") or symbol, capacity)
+        history.source = data.get("source")
+        columns = []
+        for key in ("times", "prices", "changes"):
+            column = array("d")
+            column.frombytes(base64.b64decode(data[key]))
+            columns.append(column)
+        for at, price, change in zip(*columns):
+            history.append(at, price, None if math.isnan(change) else change)
+        return history
+
+
+class MarketData:
+    """
+    Per-worker quote history built from the finance payloads this worker sees.
+
+    Every payload version is ingested once, stamped with its `last_updated`,
+    so workers reading the same shared cache build the same history and the
+    quotes endpoint never goes upstream.
+    """
+
+    def __init__(self, capacity: int = HISTORY_POINTS, max_symbols: int = MAX_SYMBOLS,
+                 snapshot_path: str = SNAPSHOT_PATH):
+        self.capacity = capacity
+        self.max_symbols = max_symbols
+        self.snapshot_path = snapshot_path
+        self.symbols = {}  # symbol -> SymbolHistory
+        self._ingested = {}  # category -> last_updated of the payload last ingested
+
+        self.payloads_ingested = 0
+        self.quotes_extracted = 0
+        self.quotes_rejected = 0
+        self.snapshots_written = 0
+        self.last_snapshot = None
+
+    def ingest(self, category: str, payload: dict) -> int:
+        """Adds the quotes in one finance payload; returns how many were recorded."""
+        at = (payload or {}).get("last_updated") or 0
+        if not at or self._ingested.get(category, 0) >= at:
+            return 0
+        self._ingested[category] = at
+        self.payloads_ingested += 1
+
+        results = [r for key in QUOTE_LISTS for r in payload.get(key) or []]
+        recorded = 0
+        for symbol, quote in extract_quotes(results).items():
+            history = self.symbols.get(symbol)
+            if history is None:
+                if len(self.symbols) >= self.max_symbols:
+                    # Make room by dropping the symbol that has gone quiet the longest
+                    del self.symbols[min(self.symbols.values(), key=lambda h: h.last_time).symbol]
+                history = self.symbols[symbol] = SymbolHistory(symbol, quote["name"], self.capacity)
+            if history.count and history.last_time >= at:
+                continue
+            if not history.plausible(quote["price"]):
+                history.rejected += 1
+                self.quotes_rejected += 1
+                if history.rejected < MAX_REJECTED:
+                    continue
+            history.rejected = 0
+            history.append(at, quote["price"], quote["change_percent"])
+            history.source = quote["source"]
+            recorded += 1
+        self.quotes_extracted += recorded
+        return recorded
+
+    def quotes(self, symbols=None, points: int = None):
+        """Latest quote and sparkline for each requested symbol (all when None)."""
+        wanted = self.symbols if symbols is None else [s for s in symbols if s in self.symbols]
+        quotes = []
+        for symbol in wanted:
+            history = self.symbols[symbol]
+            at, price, change = history.latest()
+            times, prices = history.points(points)
+            quotes.append({
+                "symbol": symbol,
+                "name": history.name,
+                "price": price,
+                "change_percent": change,
+                "updated_at": at,
+                "source": history.source,
+                "sparkline": {"times": times, "prices": prices},
+            })
+        return quotes
+
+    # -- snapshots ------------------------------------------
+
+    def snapshot(self) -> dict:
+        return {
+            "saved_at": time.time(),
+            "ingested": dict(self._ingested),
+            "symbols": {symbol: history.to_snapshot() for symbol, history in self.symbols.items()},
+        }
+
+    def save(self, snapshot: dict = None, path: str = None):
+        """Writes `snapshot` (default: the current history) to disk."""
+        path = path or self.snapshot_path
+        snapshot = snapshot or self.snapshot()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        # Atomic swap: a crash mid-write never leaves a truncated snapshot
+        os.replace(tmp, path)
+        self.snapshots_written += 1
+        self.last_snapshot = snapshot["saved_at"]
+
+    def load(self, path: str = None) -> bool:
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.symbols = {
+                symbol: SymbolHistory.from_snapshot(symbol, data, self.capacity)
+                for symbol, data in snapshot.get("symbols", {}).items()
+            }
+            self._ingested = dict(snapshot.get("ingested", {}))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable market data snapshot {path}: {e}")
+            return False
+        print(f"Restored market history for {len(self.symbols)} symbols from {path}")
+        return True
+
+    async def run_snapshots(self, interval: float = SNAPSHOT_INTERVAL):
+        """Background task: writes the history to disk every `interval` seconds."""
+        if not self.snapshot_path:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Captured on the loop so ingestion can't change the history mid-write
+                await asyncio.to_thread(self.save, self.snapshot())
+            except Exception as e:
+                print(f"Error writing market data snapshot: {e}")
+
+    def stats(self):
+        return {
+            "symbols": len(self.symbols),
+            "max_symbols": self.max_symbols,
+            "points_per_symbol": self.capacity,
+            "points": sum(h.count for h in self.symbols.values()),
+            "bytes": sum(3 * h.times.itemsize * h.capacity for h in self.symbols.values()),
+            "payloads_ingested": self.payloads_ingested,
+            "quotes_extracted": self.quotes_extracted,
+            "quotes_rejected": self.quotes_rejected,
+            "snapshot_path": self.snapshot_path or None,
+            "snapshots_written": self.snapshots_written,
+            "last_snapshot": self.last_snapshot,
+        }
+
+
+MARKET_DATA = MarketData()
@@ -0,0 +1,248 @@
+import time
+import itertools
+import contextvars
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+PREFIX = "perplexity"
+
+
+# ---------------------------------------------------------
+# Primitives
+# ---------------------------------------------------------
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = list(itertools.accumulate(self.counts))
+        return {
+            "buckets": {str(b): c for b, c in zip(self.buckets + ["+Inf"], cumulative)},
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    # repr keeps full float precision; Prometheus parses both forms
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels):
+        self.values[tuple(labels.get(n, "") for n in self.labelnames)] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in list(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class LabeledHistogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        histogram = self.series.get(key)
+        if histogram is None:
+            histogram = self.series[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, histogram in list(self.series.items()):
+            lines.extend(render_histogram(self.name, self.labelnames, key, histogram))
+        return lines
+
+
+def render_histogram(name: str, labelnames, key, histogram: Histogram):
+    lines = []
+    for bound, count in zip(histogram.buckets + ["+Inf"], itertools.accumulate(histogram.counts)):
+        lines.append(f"{name}_bucket{_labels(labelnames + ('le',), key + (bound,))} {count}")
+    lines.append(f"{name}_sum{_labels(labelnames, key)} {_number(histogram.sum)}")
+    lines.append(f"{name}_count{_labels(labelnames, key)} {histogram.count}")
+    return lines
+
+
+# ---------------------------------------------------------
+# Registry
+# ---------------------------------------------------------
+class Registry:
+    """
+    Metrics owned by this process plus collectors that export the `stats()`
+    of existing components at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._metrics.setdefault(f"{PREFIX}_{name}", Counter(f"{PREFIX}_{name}", help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS) -> LabeledHistogram:
+        full = f"{PREFIX}_{name}"
+        return self._metrics.setdefault(full, LabeledHistogram(full, help, labelnames, buckets))
+
+    def register(self, collector):
+        """`collector()` returns Prometheus text lines; it runs on every scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def gauges(name: str, stats: dict):
+    """Exports the top-level numeric fields of a stats() dict as gauges."""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            metric = f"{PREFIX}_{name}_{key}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {_number(value)}")
+    return lines
+
+
+METRICS = Registry()
+
+CHAT_TTFT = METRICS.histogram("chat_time_to_first_token_seconds", "Time from request to the first answer text.")
+CHAT_TIME_TO_SOURCE = METRICS.histogram("chat_time_to_first_source_seconds", "Time from request to the first sources.")
+CHAT_STREAM = METRICS.histogram("chat_stream_seconds", "Total chat stream time.", ("outcome",))
+LLM_CALL = METRICS.histogram("llm_call_seconds", "Duration of each LLM call.", ("model",))
+LLM_TOKENS = METRICS.counter("llm_tokens_total", "LLM tokens used.", ("model", "direction"))
+TOOL_CALL = METRICS.histogram("tool_call_seconds", "Duration of each agent tool call.", ("tool",))
+UPSTREAM_REQUEST = METRICS.histogram("upstream_request_seconds", "Upstream HTTP calls, retries included.", ("upstream", "outcome"))
+CONTEXT_TOKENS = METRICS.counter("context_tokens_total", "Estimated prompt tokens around compaction.", ("stage",))
+CONTEXT_COMPACTED = METRICS.counter("context_compacted_total", "Tool outputs trimmed and turns summarized.", ("kind",))
+RERANK_RESULTS = METRICS.counter("rerank_results_total", "Search results reranked into passages.")
+RERANK_CHARS = METRICS.counter("rerank_chars_total", "Tool output size around reranking.", ("stage",))
+CHAT_LIMIT_HITS = METRICS.counter("chat_limit_hits_total", "Chat runs cut short by the tool-round limit or the deadline.", ("limit",))
+
+
+# ---------------------------------------------------------
+# Per-request timing
+# ---------------------------------------------------------
+# Set by endpoints that report Server-Timing; inherited by the tasks they spawn.
+CURRENT_TIMING = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Named phases of one request, rendered as a Server-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # name -> [seconds, count]
+
+    def add(self, name: str, seconds: float):
+        phase = self.phases.setdefault(name, [0.0, 0])
+        phase[0] += seconds
+        phase[1] += 1
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def header(self) -> str:
+        parts = [f'{name};dur={seconds * 1000:.1f};desc="{count}x"' for name, (seconds, count) in self.phases.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def start_timing() -> RequestTiming:
+    timing = RequestTiming()
+    CURRENT_TIMING.set(timing)
+    return timing
+
+
+def record_phase(name: str, seconds: float):
+    timing = CURRENT_TIMING.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+class ChatTimer:
+    """Latency breakdown of one chat stream, fed from astream_events and the emitted records."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.first_source = None
+        self._starts = {}  # run_id -> start time
+
+    def on_event(self, event: dict):
+        kind = event["event"]
+        if kind in ("on_chat_model_start", "on_tool_start"):
+            self._starts[event.get("run_id")] = time.perf_counter()
+        elif kind == "on_chat_model_end":
+            started = self._starts.pop(event.get("run_id"), None)
+            model = event.get("metadata", {}).get("ls_model_name", "") or event.get("name", "")
+            if started is not None:
+                LLM_CALL.observe(time.perf_counter() - started, model=model)
+            usage = getattr(event["data"].get("output"), "usage_metadata", None) or {}
+            if usage:
+                LLM_TOKENS.inc(usage.get("input_tokens", 0), model=model, direction="input")
+                LLM_TOKENS.inc(usage.get("output_tokens", 0), model=model, direction="output")
+        elif kind in ("on_tool_end", "on_tool_error"):
+            started = self._starts.pop(event.get("run_id"), None)
+            if started is not None:
+                TOOL_CALL.observe(time.perf_counter() - started, tool=event.get("name", ""))
+
+    def on_record(self, kind: str):
+        if kind == "text" and self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+            CHAT_TTFT.observe(self.first_token)
+        elif kind == "sources" and self.first_source is None:
+            self.first_source = time.perf_counter() - self.started
+            CHAT_TIME_TO_SOURCE.observe(self.first_source)
+
+    def finish(self, outcome: str):
+        CHAT_STREAM.observe(time.perf_counter() - self.started, outcome=outcome)
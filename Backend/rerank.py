@@ -0,0 +1,157 @@
+import os
+import re
+import json
+from typing import List
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from compaction import message_text, CHARS_PER_TOKEN
+from text_utils import STOPWORDS
+from stream_encoder import dumps
+from metrics import RERANK_RESULTS, RERANK_CHARS
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# Token budget for all passages handed to the model after one tool round
+RERANK_TOKEN_BUDGET = int(os.environ.get("RERANK_TOKEN_BUDGET", 3000))
+PASSAGE_WORDS = int(os.environ.get("RERANK_PASSAGE_WORDS", 60))
+MAX_PASSAGES_PER_RESULT = int(os.environ.get("RERANK_PASSAGES_PER_RESULT", 3))
+FALLBACK_SNIPPET_CHARS = 160
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def split_passages(text: str) -> List[str]:
+    words = (text or "").split()
+    return [" ".join(words[i:i + PASSAGE_WORDS]) for i in range(0, len(words), PASSAGE_WORDS)]
+
+
+# ---------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------
+def bm25_scores(query: str, passages: List[str]) -> np.ndarray:
+    """BM25 score of every passage against the query, computed as one term-count matrix."""
+    terms = sorted(set(tokenize(query)))
+    if not terms or not passages:
+        return np.zeros(len(passages))
+
+    index = {t: i for i, t in enumerate(terms)}
+    counts = np.zeros((len(passages), len(terms)), dtype=np.float32)
+    lengths = np.zeros(len(passages), dtype=np.float32)
+    for row, passage in enumerate(passages):
+        tokens = tokenize(passage)
+        lengths[row] = len(tokens)
+        for token in tokens:
+            col = index.get(token)
+            if col is not None:
+                counts[row, col] += 1
+
+    df = np.count_nonzero(counts, axis=0)
+    idf = np.log(1 + (len(passages) - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    tf = counts * (BM25_K1 + 1) / (counts + norm[:, None])
+    return tf @ idf
+
+
+def rerank_results(query: str, results: List[dict], budget: int = RERANK_TOKEN_BUDGET) -> List[dict]:
+    """
+    Keeps the best-matching passages of each result within `budget` tokens.
+
+    Results keep their original order (and therefore their [n] citation
+    numbers); a result with no selected passage keeps a short snippet.
+    """
+    passages, owners = [], []
+    for i, result in enumerate(results):
+        text = result.get("raw_content") or result.get("content") or ""
+        for passage in split_passages(text):
+            passages.append(passage)
+            owners.append(i)
+
+    scores = bm25_scores(query, passages)
+    chosen = {i: [] for i in range(len(results))}
+    remaining = budget * CHARS_PER_TOKEN
+    for p in np.argsort(-scores, kind="stable"):
+        if scores[p] <= 0 or remaining <= 0:
+            break
+        owner = owners[p]
+        if len(chosen[owner]) >= MAX_PASSAGES_PER_RESULT or len(passages[p]) > remaining:
+            continue
+        chosen[owner].append(p)
+        remaining -= len(passages[p])
+
+    reranked = []
+    for i, result in enumerate(results):
+        if chosen[i]:
+            content = " ... ".join(passages[p] for p in sorted(chosen[i]))
+        else:
+            content = (result.get("content") or "")[:FALLBACK_SNIPPET_CHARS]
+        reranked.append({
+            "title": result.get("title"),
+            "url": result.get("url"),
+            "content": content,
+        })
+    return reranked
+
+
+# ---------------------------------------------------------
+# Graph Node
+# ---------------------------------------------------------
+def _tool_queries(ai_message: AIMessage) -> dict:
+    queries = {}
+    for call in getattr(ai_message, "tool_calls", None) or []:
+        args = call.get("args", {})
+        parts = [args.get("query", "")] + list(args.get("queries", []))
+        queries[call["id"]] = " ".join(p for p in parts if p)
+    return queries
+
+
+def rerank_node(state):
+    """
+    Runs between ToolNode and the agent: replaces the search dumps just
+    returned by the tools with their most relevant passages.
+    """
+    messages = state["messages"]
+    question = next((message_text(m) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    last_ai = next((m for m in reversed(messages) if isinstance(m, AIMessage)), None)
+    queries = _tool_queries(last_ai) if last_ai else {}
+
+    fresh = []  # (message, results)
+    for m in reversed(messages):
+        if not isinstance(m, ToolMessage):
+            break
+        # Fresh tool output carries the parsed result as its artifact
+        payload = m.artifact
+        if not isinstance(payload, dict):
+            try:
+                payload = json.loads(message_text(m))
+            except (ValueError, TypeError):
+                continue
+        results = payload.get("results") if isinstance(payload, dict) else None
+        if results is None:
+            continue
+        fresh.append((m, results))
+
+    # The budget covers the whole round: each tool message gets a share by its result count
+    total = sum(len(results) for _, results in fresh) or 1
+    updated = []
+    for m, results in fresh:
+        before = len(m.content)
+        query = f"{question} {queries.get(m.tool_call_id, '')}"
+        budget = RERANK_TOKEN_BUDGET * len(results) // total
+        content = dumps({"results": rerank_results(query, results, budget)})
+        RERANK_RESULTS.inc(len(results))
+        RERANK_CHARS.inc(before, stage="before")
+        RERANK_CHARS.inc(len(content), stage="after")
+        # The artifact has been streamed already; drop it so checkpoints stay small
+        updated.append(m.model_copy(update={"content": content, "artifact": None}))
+
+    return {"messages": updated[::-1]}
@@ -0,0 +1,63 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# Wall-clock cap for one chat answer, searches and LLM calls included
+CHAT_DEADLINE = float(os.environ.get("CHAT_DEADLINE", 90))
+# Agent -> tools round trips before the model must answer with what it has
+MAX_TOOL_ROUNDS = int(os.environ.get("CHAT_MAX_TOOL_ROUNDS", 3))
+DISCONNECT_POLL_INTERVAL = float(os.environ.get("DISCONNECT_POLL_INTERVAL", 0.5))
+
+# Graph super-steps per agent -> tools -> rerank round
+STEPS_PER_ROUND = 3
+# Smallest per-call timeout handed to upstream calls near the deadline
+MIN_CALL_TIMEOUT = 0.05
+
+RUN_COUNTS = {"started": 0, "completed": 0, "cancelled": 0, "timed_out": 0, "failed": 0}
+
+
+def run_config(thread_id: str, deadline: float = CHAT_DEADLINE, max_tool_rounds: int = MAX_TOOL_ROUNDS) -> dict:
+    """Graph config for one chat run; tools and the agent read the limits from `configurable`."""
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "deadline": time.monotonic() + deadline,
+            "max_tool_rounds": max_tool_rounds,
+        },
+        # Backstop in case the model keeps calling tools past the soft cap
+        "recursion_limit": STEPS_PER_ROUND * (max_tool_rounds + 1) + 1,
+    }
+
+
+def time_left(config) -> float:
+    """Seconds until the run's deadline, or None when the run has none."""
+    deadline = (config or {}).get("configurable", {}).get("deadline")
+    if deadline is None:
+        return None
+    return max(MIN_CALL_TIMEOUT, deadline - time.monotonic())
+
+
+@asynccontextmanager
+async def watch_disconnect(request):
+    """Cancels the current task as soon as the HTTP client goes away."""
+    task = asyncio.current_task()
+
+    async def watch():
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+        print("Client disconnected, cancelling chat run")
+        task.cancel()
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+
+def stats():
+    return dict(RUN_COUNTS)
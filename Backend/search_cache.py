@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from search_client import SEARCH_CLIENT
+from article_index import ARTICLE_INDEX
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# Seconds a cached search stays fresh, per Tavily topic.
+TOPIC_TTLS = {
+    "news": float(os.environ.get("SEARCH_CACHE_TTL_NEWS", 60)),
+    "finance": float(os.environ.get("SEARCH_CACHE_TTL_FINANCE", 120)),
+    "general": float(os.environ.get("SEARCH_CACHE_TTL_GENERAL", 900)),
+}
+DEFAULT_TTL = TOPIC_TTLS["general"]
+
+MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 512))
+MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def make_key(query: str, topic: str = "general", max_results: int = 5, include_images: bool = False):
+    return (normalize_query(query), topic, int(max_results), bool(include_images))
+
+
+# ---------------------------------------------------------
+# Cache
+# ---------------------------------------------------------
+class SearchCache:
+    """
+    TTL + LRU cache for upstream search responses.
+
+    Bounded by entry count and by the approximate JSON size of the stored
+    responses. Concurrent lookups for the same key share one upstream call
+    (single-flight), whether the callers are sync threads or coroutines.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, ttls: dict = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(TOPIC_TTLS if ttls is None else ttls)
+
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._inflight = {}  # key -> concurrent.futures.Future
+        self._tasks = set()  # detached async fetches, kept referenced until done
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # -- internal helpers (caller holds self._lock) ---------
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        try:
+            size = len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+
+        ttl = self.ttls.get(key[1], DEFAULT_TTL)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _claim(self, key, refresh: bool = False):
+        """
+        Returns (value, future, leader). Exactly one of value/future is set;
+        leader is True when the caller must perform the upstream fetch.
+        With `refresh` a stored value is skipped, but an in-flight fetch is
+        still shared.
+        """
+        with self._lock:
+            value = None if refresh else self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value, None, False
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                return None, future, False
+
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future
+            return None, future, True
+
+    def _resolve(self, key, future, value=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None and value:
+                self._store(key, value)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    # -- public API -----------------------------------------
+
+    def get(self, key, fetch):
+        """Sync lookup; `fetch()` is called on a miss."""
+        value, future, leader = self._claim(key)
+        if value is not None:
+            return value
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            self._resolve(key, future, error=e)
+            raise
+        self._resolve(key, future, value)
+        return value
+
+    async def aget(self, key, afetch, timeout: float = None, refresh: bool = False):
+        """
+        Async lookup; `await afetch()` is called on a miss, or always with
+        `refresh` (the new value replaces the stored one).
+
+        The fetch runs in its own task, so a caller that is cancelled or gives
+        up after `timeout` seconds never takes the shared fetch (or the other
+        callers waiting on it) down with it.
+        """
+        value, future, leader = self._claim(key, refresh)
+        if value is not None:
+            return value
+        if leader:
+            task = asyncio.create_task(self._afetch(key, future, afetch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        shared = asyncio.wrap_future(future)
+        # A caller that gave up leaves nobody to read a failure; don't log it as unretrieved
+        shared.add_done_callback(lambda f: f.cancelled() or f.exception())
+        waiter = asyncio.shield(shared)
+        if timeout is None:
+            return await waiter
+        return await asyncio.wait_for(waiter, timeout)
+
+    async def _afetch(self, key, future, afetch):
+        try:
+            value = await afetch()
+        except BaseException as e:
+            self._resolve(key, future, error=e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        self._resolve(key, future, value)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[1]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "inflight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits + self.shared) / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache shared by chat, finance and discover.
+SEARCH_CACHE = SearchCache()
+
+
+def _index_results(response: dict, topic: str):
+    try:
+        ARTICLE_INDEX.add(response.get("results", []), topic)
+    except Exception as e:
+        print(f"Error indexing search results: {e}")
+
+
+def cached_search(query: str, topic: str = "general", max_results: int = 5, include_images: bool = False):
+    """Blocking Tavily search through the shared cache and client."""
+    key = make_key(query, topic, max_results, include_images)
+
+    def fetch():
+        response = SEARCH_CLIENT.search_sync(query, topic=topic, max_results=max_results, include_images=include_images)
+        _index_results(response, topic)
+        return response
+
+    return SEARCH_CACHE.get(key, fetch)
+
+
+async def acached_search(query: str, topic: str = "general", max_results: int = 5, include_images: bool = False,
+                         timeout: float = None, refresh: bool = False):
+    """
+    Async Tavily search through the shared cache and client. `timeout` bounds
+    how long this caller waits; the shared upstream fetch keeps the client's
+    own timeout so one caller's deadline is not imposed on the others.
+    `refresh` goes upstream even when a cached response is still fresh.
+    """
+    key = make_key(query, topic, max_results, include_images)
+
+    async def afetch():
+        response = await SEARCH_CLIENT.search(
+            query, topic=topic, max_results=max_results, include_images=include_images
+        )
+        # Every upstream result also lands in the local full-text index, off the event loop
+        asyncio.get_running_loop().run_in_executor(None, _index_results, response, topic)
+        return response
+
+    return await SEARCH_CACHE.aget(key, afetch, timeout, refresh)
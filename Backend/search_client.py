@@ -0,0 +1,249 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+import httpx
+from dotenv import load_dotenv
+
+from admission import LIMITERS
+from metrics import UPSTREAM_REQUEST, record_phase
+
+load_dotenv()
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+TAVILY_API_URL = os.environ.get("TAVILY_API_URL", "https://api.tavily.com")
+POOL_SIZE = int(os.environ.get("SEARCH_POOL_SIZE", 20))
+POOL_KEEPALIVE = int(os.environ.get("SEARCH_POOL_KEEPALIVE", 10))
+KEEPALIVE_EXPIRY = float(os.environ.get("SEARCH_KEEPALIVE_EXPIRY", 60))
+DEFAULT_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", 20))
+MAX_RETRIES = int(os.environ.get("SEARCH_MAX_RETRIES", 2))
+RETRY_BACKOFF = float(os.environ.get("SEARCH_RETRY_BACKOFF", 0.5))
+MAX_RETRY_DELAY = 10.0
+
+# 429 and 5xx are worth retrying; other statuses are caller errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SearchUpstreamError(Exception):
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _error_detail(response: httpx.Response) -> str:
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text[:200]
+    detail = body.get("detail", body) if isinstance(body, dict) else body
+    if isinstance(detail, dict):
+        detail = detail.get("error", detail)
+    return str(detail)[:200]
+
+
+# ---------------------------------------------------------
+# Client
+# ---------------------------------------------------------
+class SearchClient:
+    """
+    Process-wide Tavily search client.
+
+    Keeps one pooled keep-alive HTTP client per mode (async for the server,
+    sync for scripts and the sync agent path), applies per-call timeouts and
+    retries transient failures with jittered exponential backoff. Async calls
+    go through the "tavily" admission limiter.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = TAVILY_API_URL,
+                 pool_size: int = POOL_SIZE, keepalive: int = POOL_KEEPALIVE,
+                 timeout: float = DEFAULT_TIMEOUT, max_retries: int = MAX_RETRIES,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Optional stand-in for the async HTTP transport (e.g. httpx.MockTransport in benchmarks)
+        self.transport = transport
+
+        self._async_client = None
+        self._sync_client = None
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.active = 0
+        self.peak_active = 0
+        self.total_seconds = 0.0
+
+    # -- clients --------------------------------------------
+
+    def _headers(self):
+        api_key = self.api_key or os.environ.get("TAVILY_API_KEY")
+        if not api_key:
+            raise SearchUpstreamError("TAVILY_API_KEY is not set")
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+
+    def _aclient(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url, headers=self._headers(), limits=self.limits, timeout=self.timeout,
+                transport=self.transport,
+            )
+        return self._async_client
+
+    def _client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(
+                    base_url=self.base_url, headers=self._headers(), limits=self.limits, timeout=self.timeout
+                )
+            return self._sync_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    # -- bookkeeping ----------------------------------------
+
+    def _start(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        return time.perf_counter()
+
+    def _finish(self, started: float, ok: bool):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.active -= 1
+            self.total_seconds += elapsed
+            if not ok:
+                self.failures += 1
+        UPSTREAM_REQUEST.observe(elapsed, upstream="tavily", outcome="ok" if ok else "error")
+        record_phase("tavily", elapsed)
+
+    def _retry_delay(self, attempt: int, response: httpx.Response = None) -> float:
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(MAX_RETRY_DELAY, float(response.headers["Retry-After"]))
+        delay = RETRY_BACKOFF * 2 ** attempt
+        return min(MAX_RETRY_DELAY, delay * random.uniform(0.5, 1.5))
+
+    @staticmethod
+    def _payload(query, topic, max_results, include_images, params):
+        return {
+            "query": query,
+            "topic": topic,
+            "max_results": max_results,
+            "include_images": include_images,
+            **params,
+        }
+
+    def _check(self, response: httpx.Response, attempt: int):
+        """Returns the JSON body, None to retry, or raises."""
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+            return None
+        raise SearchUpstreamError(
+            f"Tavily search failed ({response.status_code}): {_error_detail(response)}",
+            response.status_code,
+        )
+
+    # -- search ---------------------------------------------
+
+    async def search(self, query: str, topic: str = "general", max_results: int = 5,
+                     include_images: bool = False, timeout: float = None, **params) -> dict:
+        payload = self._payload(query, topic, max_results, include_images, params)
+        client = self._aclient()
+        started = self._start()
+        ok = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                try:
+                    async with LIMITERS["tavily"].slot():
+                        response = await client.post("/search", json=payload, timeout=timeout or self.timeout)
+                    result = self._check(response, attempt)
+                    if result is not None:
+                        ok = True
+                        return result
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                with self._lock:
+                    self.retries += 1
+                await asyncio.sleep(self._retry_delay(attempt, response))
+        finally:
+            self._finish(started, ok)
+
+    def search_sync(self, query: str, topic: str = "general", max_results: int = 5,
+                    include_images: bool = False, timeout: float = None, **params) -> dict:
+        payload = self._payload(query, topic, max_results, include_images, params)
+        client = self._client()
+        started = self._start()
+        ok = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                try:
+                    with LIMITERS["tavily"].sync_slot():
+                        response = client.post("/search", json=payload, timeout=timeout or self.timeout)
+                    result = self._check(response, attempt)
+                    if result is not None:
+                        ok = True
+                        return result
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self._retry_delay(attempt, response))
+        finally:
+            self._finish(started, ok)
+
+    # -- metrics --------------------------------------------
+
+    @staticmethod
+    def _open_connections(client) -> int:
+        # httpx does not expose pool state publicly; read httpcore's pool if present
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        return len(getattr(pool, "connections", []) or [])
+
+    def stats(self):
+        with self._lock:
+            completed = self.requests - self.active
+            return {
+                "pool_size": self.limits.max_connections,
+                "keepalive": self.limits.max_keepalive_connections,
+                "open_connections": (
+                    (self._open_connections(self._async_client) if self._async_client else 0)
+                    + (self._open_connections(self._sync_client) if self._sync_client else 0)
+                ),
+                "active": self.active,
+                "peak_active": self.peak_active,
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "avg_seconds": self.total_seconds / completed if completed else 0.0,
+            }
+
+
+# Shared by chat, finance and discover.
+SEARCH_CLIENT = SearchClient()
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# One file shared by every uvicorn worker on the host
+SHARED_CACHE_DB = os.environ.get("SHARED_CACHE_DB", "shared_cache.sqlite")
+LEADER_LOCK_FILE = os.environ.get("LEADER_LOCK_FILE", SHARED_CACHE_DB + ".leader")
+# How often followers try to take over the refresh loop
+ELECTION_INTERVAL = float(os.environ.get("LEADER_ELECTION_INTERVAL", 5))
+# Byte offset of the leader's pid in the lock file (byte 0 is the locked region on Windows)
+PID_OFFSET = 16
+
+
+# ---------------------------------------------------------
+# Store
+# ---------------------------------------------------------
+class SharedCache:
+    """
+    Cross-process JSON key-value store on SQLite in WAL mode.
+
+    Every worker reads the same rows, so all of them serve the same latest
+    payloads. Decoded values are memoized per process and dropped as soon as
+    `PRAGMA data_version` shows another process has written.
+
+    Writes can wait up to the busy timeout on another worker's lock, so async
+    code uses the `a*` variants, which run them on one writer thread.
+    """
+
+    def __init__(self, path: str = SHARED_CACHE_DB):
+        self.path = path
+        self.owner = f"{os.getpid()}-{id(self)}"
+        # Reads and writes use separate connections and locks: in WAL mode a
+        # read never waits on another worker's write lock, but a write can sit
+        # out the whole busy timeout and must not hold up reads meanwhile.
+        self._read_conn = None
+        self._read_lock = threading.Lock()
+        self._write_conn = None
+        self._write_lock = threading.Lock()
+        self._memo = {}  # (namespace, key) -> value
+        self._data_version = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-cache-writer")
+
+        self.reads = 0
+        self.memo_hits = 0
+        self.writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10, isolation_level=None)
+        conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # Caller holds self._read_lock
+        if self._read_conn is None:
+            self._read_conn = self._connect()
+        return self._read_conn
+
+    def _db(self) -> sqlite3.Connection:
+        # Caller holds self._write_lock
+        if self._write_conn is None:
+            self._write_conn = self._connect()
+        return self._write_conn
+
+    def _sync_memo(self, db):
+        version = db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._memo.clear()
+            self._data_version = version
+
+    def get(self, namespace: str, key: str):
+        with self._read_lock:
+            db = self._reader()
+            self._sync_memo(db)
+            memo_key = (namespace, key)
+            if memo_key in self._memo:
+                self.memo_hits += 1
+                return self._memo[memo_key]
+            self.reads += 1
+            row = db.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            value = json.loads(row[0]) if row else None
+            self._memo[memo_key] = value
+            return value
+
+    def set(self, namespace: str, key: str, value):
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._write_lock:
+            self._db().execute(
+                "INSERT INTO entries (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (namespace, key, encoded, time.time()),
+            )
+            self.writes += 1
+        with self._read_lock:
+            self._sync_memo(self._reader())
+            self._memo[(namespace, key)] = value
+
+    def claim(self, name: str, ttl: float) -> bool:
+        """
+        Takes a short lease so only one worker does a piece of work (e.g. a
+        refresh) at a time. Expired leases can be taken over.
+        """
+        now = time.time()
+        with self._write_lock:
+            cursor = self._db().execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+                (name, self.owner, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, name: str):
+        with self._write_lock:
+            self._db().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+    async def _write(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+
+    async def aset(self, namespace: str, key: str, value):
+        await self._write(self.set, namespace, key, value)
+
+    async def aclaim(self, name: str, ttl: float) -> bool:
+        return await self._write(self.claim, name, ttl)
+
+    async def arelease(self, name: str):
+        await self._write(self.release, name)
+
+    def close(self):
+        # Let queued writes land before the connection goes away
+        self._writer.shutdown(wait=True)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-cache-writer")
+        with self._write_lock:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+            self._memo.clear()
+
+    def stats(self):
+        with self._read_lock:
+            rows = self._reader().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "path": self.path,
+            "rows": rows,
+            "reads": self.reads,
+            "memo_hits": self.memo_hits,
+            "writes": self.writes,
+        }
+
+
+# ---------------------------------------------------------
+# Leader Election
+# ---------------------------------------------------------
+class LeaderElection:
+    """
+    Picks one worker on the host to run the background refresh loops.
+
+    The leader holds an exclusive lock on a file; the OS drops it when that
+    process dies, and the next follower to poll takes over.
+    """
+
+    def __init__(self, path: str = LEADER_LOCK_FILE, interval: float = ELECTION_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._fd = None
+        self.elected_at = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+
+        os.lseek(fd, PID_OFFSET, os.SEEK_SET)
+        os.write(fd, f"{os.getpid():<16}".encode())
+        self._fd = fd
+        self.elected_at = time.time()
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self.elected_at = None
+
+    def leader_pid(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(PID_OFFSET)
+                return int(f.read(16).strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    async def run(self, work):
+        """
+        Awaits `work()` once this worker is elected; until then keeps polling
+        the lock so a dead leader is replaced within about `interval` seconds.
+        """
+        while not self.try_acquire():
+            await asyncio.sleep(self.interval * random.uniform(0.5, 1.5))
+        print(f"Worker {os.getpid()} elected refresh leader")
+        try:
+            await work()
+        finally:
+            self.release()
+
+    def status(self):
+        return {
+            "pid": os.getpid(),
+            "is_leader": self.is_leader,
+            "leader_pid": self.leader_pid(),
+            "elected_at": self.elected_at,
+        }
+
+
+SHARED_CACHE = SharedCache()
+LEADER = LeaderElection()
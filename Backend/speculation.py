@@ -0,0 +1,116 @@
+import os
+import asyncio
+
+from search_cache import acached_search, normalize_query
+from text_utils import STOPWORDS
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+SPECULATIVE_SEARCH = os.environ.get("SPECULATIVE_SEARCH", "0").lower() in ("1", "true", "yes")
+# Minimum word overlap (Jaccard) between the user's message and the model's query to reuse
+MATCH_THRESHOLD = float(os.environ.get("SPECULATIVE_MATCH_THRESHOLD", 0.5))
+
+
+def query_terms(text: str) -> set:
+    words = normalize_query(text).replace("?", " ").replace(",", " ").split()
+    return {w for w in words if w not in STOPWORDS}
+
+
+def similarity(a: str, b: str) -> float:
+    ta, tb = query_terms(a), query_terms(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+# ---------------------------------------------------------
+# Speculative Search
+# ---------------------------------------------------------
+class SpeculativeSearch:
+    """
+    A search on the user's own message, started alongside the first LLM call.
+
+    The search tool reuses it when the model's query is close enough to the
+    message. A mismatching query leaves it running for parallel tool calls
+    that may still match; it is cancelled when the chat run ends.
+    """
+
+    def __init__(self, message: str):
+        self.query = normalize_query(message)
+        self.task = asyncio.create_task(acached_search(self.query, max_results=10, include_images=True))
+        self.reused = False
+
+    def matches(self, query: str) -> bool:
+        return similarity(self.query, query) >= MATCH_THRESHOLD
+
+    async def take(self, query: str):
+        """Returns the speculative response for a matching query, otherwise None."""
+        if self.task.cancelled() or not self.matches(query):
+            return None
+        try:
+            response = await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            # The speculative task was cancelled under us: a miss, search for real.
+            # If it's this caller being cancelled, let that propagate.
+            if self.task.cancelled():
+                return None
+            raise
+        except Exception:
+            return None
+        self.reused = True
+        return response
+
+    def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+
+
+async def with_speculation(events, speculative: SpeculativeSearch = None):
+    """
+    Interleaves an `on_speculative_search` event into an astream_events
+    iterator as soon as the speculative search lands.
+    """
+    if speculative is None:
+        async for event in events:
+            yield event
+        return
+
+    queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for event in events:
+                queue.put_nowait(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            queue.put_nowait(e)
+            return
+        queue.put_nowait(done)
+
+    def landed(task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None:
+            return
+        response = task.result()
+        queue.put_nowait({
+            "event": "on_speculative_search",
+            "name": "tavily_search",
+            "data": {"output": {"results": response["results"], "images": response.get("images", [])}},
+        })
+
+    speculative.task.add_done_callback(landed)
+    pump_task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        speculative.task.remove_done_callback(landed)
+        speculative.cancel()
+        pump_task.cancel()
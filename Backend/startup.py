@@ -0,0 +1,161 @@
+"""
+Staged warmup for the API process, plus an import-time profile.
+
+    python startup.py --top 20
+
+prints the slowest top-level packages imported by `main`, measured with
+`python -X importtime`.
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import inspect
+import argparse
+import subprocess
+from collections import defaultdict
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# Pause before the background refresh loops start, so they don't compete with the first requests
+BACKGROUND_DELAY = float(os.environ.get("WARMUP_BACKGROUND_DELAY", 1.0))
+
+
+# ---------------------------------------------------------
+# Warmup
+# ---------------------------------------------------------
+class Warmup:
+    """
+    Runs the start-up steps one after another in the background, each timed
+    on its own, so the server accepts connections (and answers /healthz)
+    before anything heavy has happened.
+
+    Handlers that need a step await `wait(name)`. A failed optional step is
+    reported but does not hold back readiness.
+    """
+
+    def __init__(self):
+        self.stages = {}  # name -> {"fn", "required", "status", "seconds", "error"}
+        self._done = {}  # name -> asyncio.Event, created on the serving loop
+        self.import_started = None
+        self.import_seconds = None
+        self.ready_seconds = None
+
+    def imported(self, started: float):
+        """Records how long the app's own imports took, from a perf_counter() taken first thing."""
+        self.import_started = started
+        self.import_seconds = time.perf_counter() - started
+
+    def add(self, name: str, fn, required: bool = True):
+        """Registers a step; `fn` is a coroutine function or a blocking callable (run in a thread)."""
+        self.stages[name] = {"fn": fn, "required": required, "status": "pending", "seconds": None, "error": None}
+
+    def _event(self, name: str) -> asyncio.Event:
+        if name not in self._done:
+            self._done[name] = asyncio.Event()
+        return self._done[name]
+
+    @property
+    def ready(self) -> bool:
+        return all(s["status"] == "done" for s in self.stages.values() if s["required"])
+
+    async def run(self):
+        for name, stage in self.stages.items():
+            stage["status"] = "running"
+            started = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(stage["fn"]):
+                    await stage["fn"]()
+                else:
+                    await asyncio.to_thread(stage["fn"])
+                stage["status"] = "done"
+            except Exception as e:
+                stage["status"] = "failed"
+                stage["error"] = str(e)
+                print(f"Startup stage {name} failed: {e}")
+            stage["seconds"] = round(time.perf_counter() - started, 4)
+            self._event(name).set()
+            # Optional stages after the last required one don't count towards readiness
+            if self.ready and self.ready_seconds is None and self.import_started is not None:
+                self.ready_seconds = round(time.perf_counter() - self.import_started, 4)
+
+        timings = ", ".join(f"{name} {s['seconds']}s" for name, s in self.stages.items())
+        print(f"Warmup finished ({timings}); ready {self.ready}")
+
+    async def wait(self, name: str, raise_on_failure: bool = True):
+        """Returns once step `name` has run; raises if it failed (unless told not to)."""
+        await self._event(name).wait()
+        stage = self.stages[name]
+        if stage["status"] == "failed" and raise_on_failure:
+            raise RuntimeError(f"startup stage {name} failed: {stage['error']}")
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds,
+            "degraded": [name for name, s in self.stages.items() if s["status"] == "failed" and not s["required"]],
+            "stages": {
+                name: {k: s[k] for k in ("status", "required", "seconds", "error")}
+                for name, s in self.stages.items()
+            },
+        }
+
+    def stats(self):
+        stats = {"ready": self.ready, "import_seconds": self.import_seconds, "ready_seconds": self.ready_seconds}
+        for name, stage in self.stages.items():
+            stats[f"{name}_seconds"] = stage["seconds"]
+        return stats
+
+
+WARMUP = Warmup()
+
+
+# ---------------------------------------------------------
+# Import Profile
+# ---------------------------------------------------------
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def import_profile(module: str = "main", top: int = 15):
+    """
+    Imports `module` in a fresh interpreter under -X importtime and sums the
+    self time per top-level package. Returns (total seconds, [(package, seconds)]).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    per_package = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = match.groups()
+        per_package[name.split(".")[0]] += int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    ranked = sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return total / 1e6, [(package, us / 1e6) for package, us in ranked]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show which packages dominate the app's import time.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    total, ranked = import_profile(args.module, args.top)
+    print(f"import {args.module}: {total:.3f}s")
+    for package, seconds in ranked:
+        print(f"  {seconds:8.3f}s  {package}")
+
+
+if __name__ == "__main__":
+    main()
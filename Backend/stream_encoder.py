@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import asyncio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ---------------------------------------------------------
+# Config
+# ---------------------------------------------------------
+# "orjson" when installed, otherwise the stdlib encoder
+JSON_BACKEND = os.environ.get("STREAM_JSON_BACKEND", "orjson" if orjson else "json")
+# Text deltas are held back until this much time has passed or this many bytes are buffered
+FLUSH_INTERVAL = float(os.environ.get("STREAM_FLUSH_INTERVAL", 0.03))
+FLUSH_BYTES = int(os.environ.get("STREAM_FLUSH_BYTES", 256))
+
+# Line protocol type per record kind
+PROTOCOL_TYPES = {"text": "0", "error": "0", "sources": "2", "images": "3"}
+
+if JSON_BACKEND == "orjson" and orjson is not None:
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+else:
+    def dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+# ---------------------------------------------------------
+# Encoder
+# ---------------------------------------------------------
+class StreamEncoder:
+    """
+    Encodes (kind, payload) records for the wire, either as the `0:/2:/3:`
+    line protocol or as `text/event-stream` events.
+
+    Consecutive text deltas are merged into one write; any other record
+    flushes the pending text first so the order is preserved.
+    """
+
+    def __init__(self, mode: str = "lines", flush_interval: float = FLUSH_INTERVAL, flush_bytes: int = FLUSH_BYTES):
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._text = []
+        self._text_bytes = 0
+        self._first_at = None
+
+        self.records = 0
+        self.writes = 0
+
+    @property
+    def media_type(self) -> str:
+        return "text/event-stream" if self.mode == "sse" else "text/plain"
+
+    def _encode(self, kind: str, payload) -> str:
+        self.writes += 1
+        if self.mode == "sse":
+            return sse_event(kind, payload)
+        return f"{PROTOCOL_TYPES[kind]}:{dumps(payload)}\n"
+
+    def time_to_flush(self):
+        """Seconds until buffered text must go out, or None when nothing is buffered."""
+        if self._first_at is None:
+            return None
+        return max(0.0, self._first_at + self.flush_interval - time.monotonic())
+
+    def feed(self, kind: str, payload) -> str:
+        """Adds one record; returns whatever is ready to write (possibly "")."""
+        self.records += 1
+        if kind == "text":
+            if not payload:
+                return ""
+            self._text.append(payload)
+            self._text_bytes += len(payload)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            if self._text_bytes >= self.flush_bytes or self.time_to_flush() == 0:
+                return self.flush()
+            return ""
+        return self.flush() + self._encode(kind, payload)
+
+    def flush(self) -> str:
+        if not self._text:
+            return ""
+        text = "".join(self._text)
+        self._text = []
+        self._text_bytes = 0
+        self._first_at = None
+        return self._encode("text", text)
+
+    def close(self) -> str:
+        tail = self.flush()
+        if self.mode == "sse":
+            tail += sse_event("done", {})
+        return tail
+
+
+async def encode_stream(records, encoder: StreamEncoder):
+    """
+    Drains an async iterator of (kind, payload) records through `encoder`,
+    flushing buffered text when its window closes even if no record follows.
+    """
+    queue = asyncio.Queue()
+    done = object()
+    cancelled = object()
+
+    async def pump():
+        try:
+            async for record in records:
+                queue.put_nowait(record)
+        except asyncio.CancelledError:
+            # Cancelled from inside the records (e.g. the client went away):
+            # wake the consumer so the stream ends instead of waiting forever
+            queue.put_nowait(cancelled)
+            raise
+        except Exception as e:
+            queue.put_nowait(e)
+            return
+        queue.put_nowait(done)
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), encoder.time_to_flush())
+            except asyncio.TimeoutError:
+                chunk = encoder.flush()
+                if chunk:
+                    yield chunk
+                continue
+            if item is done:
+                break
+            if item is cancelled:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            chunk = encoder.feed(*item)
+            if chunk:
+                yield chunk
+        tail = encoder.close()
+        if tail:
+            yield tail
+    finally:
+        pump_task.cancel()
@@ -0,0 +1,114 @@
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admission
+from admission import UpstreamLimiter, AdmissionRejected, INTERACTIVE, DASHBOARD, BACKGROUND
+
+
+class PriorityTest(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_are_admitted_by_priority_then_arrival(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, concurrency=1)
+        await limiter.acquire(DASHBOARD)
+
+        admitted = []
+
+        async def call(priority, name):
+            async with limiter.slot(priority):
+                admitted.append(name)
+
+        waiters = []
+        for priority, name in [(BACKGROUND, "bg"), (DASHBOARD, "dash-1"), (INTERACTIVE, "chat"), (DASHBOARD, "dash-2")]:
+            waiters.append(asyncio.create_task(call(priority, name)))
+            await asyncio.sleep(0)
+
+        limiter.release(DASHBOARD)
+        await asyncio.gather(*waiters)
+        self.assertEqual(admitted, ["chat", "dash-1", "dash-2", "bg"])
+        self.assertEqual(limiter.active, 0)
+
+    async def test_background_is_capped_to_its_share(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, concurrency=2)
+        self.assertEqual(limiter.background_limit, 1)
+        await limiter.acquire(BACKGROUND)
+
+        second = asyncio.create_task(limiter.acquire(BACKGROUND))
+        await asyncio.sleep(0.01)
+        self.assertFalse(second.done())
+
+        # A foreground call still gets the free slot
+        await asyncio.wait_for(limiter.acquire(INTERACTIVE), 1)
+
+        limiter.release(BACKGROUND)
+        limiter.release(INTERACTIVE)
+        await asyncio.wait_for(second, 1)
+        self.assertEqual(limiter.active_background, 1)
+
+    async def test_rate_limit_spaces_out_calls(self):
+        limiter = UpstreamLimiter("test", rate=20, burst=1, concurrency=10)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(3):
+            async with limiter.slot(INTERACTIVE):
+                pass
+        # One token up front, then one every 50 ms
+        self.assertGreaterEqual(loop.time() - started, 0.09)
+
+    async def test_background_is_dropped_when_its_queue_is_full(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, concurrency=1)
+        await limiter.acquire(INTERACTIVE)
+        with mock.patch.object(admission, "BACKGROUND_MAX_QUEUE", 1):
+            queued = asyncio.create_task(limiter.acquire(BACKGROUND))
+            await asyncio.sleep(0)
+            with self.assertRaises(AdmissionRejected):
+                await limiter.acquire(BACKGROUND)
+        self.assertEqual(limiter.dropped, 1)
+
+        limiter.release(INTERACTIVE)
+        await asyncio.wait_for(queued, 1)
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, concurrency=1)
+        await limiter.acquire(INTERACTIVE)
+        waiter = asyncio.create_task(limiter.acquire(INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(limiter.queue_depth[INTERACTIVE], 0)
+
+        limiter.release(INTERACTIVE)
+        self.assertEqual(limiter.active, 0)
+        await asyncio.wait_for(limiter.acquire(INTERACTIVE), 1)
+
+
+class SyncSlotTest(unittest.IsolatedAsyncioTestCase):
+    async def test_threads_share_the_serving_loops_limit(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, concurrency=1)
+        async with limiter.slot(INTERACTIVE):
+            pass  # binds the serving loop
+
+        peak = []
+
+        def call():
+            with limiter.sync_slot(INTERACTIVE):
+                peak.append(limiter.active)
+
+        await asyncio.gather(*(asyncio.to_thread(call) for _ in range(4)))
+        self.assertEqual(peak, [1, 1, 1, 1])
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.active, 0)
+        self.assertEqual(limiter.admitted[INTERACTIVE], 5)
+
+    def test_without_a_serving_loop_calls_go_straight_through(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, concurrency=1)
+        with limiter.sync_slot(INTERACTIVE):
+            self.assertEqual(limiter.active, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discover
+from shared_cache import SharedCache
+
+
+class SharedFetchTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = SharedCache(os.path.join(self.dir, "shared.sqlite"))
+        self.searches = 0
+        self.search_delay = 0.05
+        self.patches = [
+            mock.patch.object(discover, "SHARED_CACHE", self.cache),
+            mock.patch.object(discover, "acached_search", self.search),
+        ]
+        for p in self.patches:
+            p.start()
+        discover.INFLIGHT.clear()
+
+    async def asyncTearDown(self):
+        for task in list(discover.INFLIGHT.values()):
+            task.cancel()
+        for p in self.patches:
+            p.stop()
+        self.cache.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    async def search(self, query, topic="general", max_results=5, include_images=False, timeout=None, refresh=False):
+        self.searches += 1
+        await asyncio.sleep(self.search_delay)
+        return {"results": [{"title": f"story {self.searches}", "url": "https://example.com"}], "images": []}
+
+    async def test_concurrent_misses_share_one_fetch(self):
+        pages = await asyncio.gather(*(discover.get_discover_content("top") for _ in range(5)))
+        self.assertEqual(self.searches, 1)
+        self.assertTrue(all(page["results"][0]["title"] == "story 1" for page in pages))
+        self.assertEqual(discover.INFLIGHT, {})
+
+    async def test_scheduler_and_requests_share_the_in_flight_fetch(self):
+        background = discover.fetch_shared("sports")
+        page = await discover.get_discover_content("sports")
+        previous, data = await background
+        self.assertEqual(self.searches, 1)
+        self.assertIsNone(previous)
+        self.assertEqual(page, data)
+
+    async def test_slow_miss_returns_pending_and_keeps_fetching(self):
+        self.search_delay = 0.3
+        with mock.patch.object(discover, "MISS_WAIT_TIMEOUT", 0.05):
+            page = await discover.get_discover_content("finance")
+        self.assertEqual(page, {"results": [], "images": [], "pending": True})
+
+        # The request giving up did not cancel the fetch; it lands in the cache
+        await asyncio.wait_for(discover.INFLIGHT["finance"], 1)
+        self.assertEqual(self.cache.get(discover.CACHE_NAMESPACE, "finance")["results"][0]["title"], "story 1")
+        self.assertEqual((await discover.get_discover_content("finance"))["results"][0]["title"], "story 1")
+        self.assertEqual(self.searches, 1)
+
+    async def test_cached_payload_is_served_without_fetching(self):
+        self.cache.set(discover.CACHE_NAMESPACE, "tech_science", {"results": ["cached"], "images": [], "last_updated": 1})
+        page = await discover.get_discover_content("tech_science")
+        self.assertEqual(page["results"], ["cached"])
+        self.assertEqual(self.searches, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
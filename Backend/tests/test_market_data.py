@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import extract_quotes, MarketData
+
+
+def quotes(title: str, content: str = ""):
+    return extract_quotes([{"title": title, "content": content, "url": "https://example.com"}])
+
+
+class ExtractQuotesTest(unittest.TestCase):
+    def test_prices_with_dollar_separator_or_decimals(self):
+        found = quotes(
+            "Stock market today: S&P 500 rises 0.4% to 5,870.12; Dow Jones down 120 points at 43,100.5, -0.3%",
+            "Nvidia (NASDAQ: NVDA) traded at $142.10, up 3.2%. Bitcoin +2.3% to $67,123.45.",
+        )
+        self.assertEqual(found["SPX"]["price"], 5870.12)
+        self.assertEqual(found["SPX"]["change_percent"], 0.4)
+        self.assertEqual(found["DJI"]["price"], 43100.5)
+        self.assertEqual(found["DJI"]["change_percent"], -0.3)
+        self.assertEqual(found["NVDA"]["price"], 142.10)
+        self.assertEqual(found["BTC"]["price"], 67123.45)
+
+    def test_index_name_is_not_a_price(self):
+        self.assertEqual(quotes("Dow Jones, S&P 500 futures rise as traders await Fed"), {})
+        self.assertEqual(quotes("Nasdaq 100 futures slip 0.4% ahead of Nvidia earnings"), {})
+        self.assertEqual(quotes("Stocks mixed as Russell 2000 lags; Nasdaq Composite flat"), {})
+
+    def test_counts_and_ordinals_are_not_prices(self):
+        self.assertEqual(quotes("S&P 500 hits record for 3rd session as tech rallies"), {})
+        self.assertEqual(quotes("Bitcoin ETFs see 5 straight days of outflows"), {})
+        self.assertEqual(quotes("Ethereum slides for 2 weeks in a row"), {})
+        self.assertEqual(quotes("Bitcoin mining stocks jump in 2025"), {})
+
+    def test_value_after_the_next_symbol_belongs_to_it(self):
+        found = quotes("Dow Jones, S&P 500 at 5,870.12 in early trade")
+        self.assertNotIn("DJI", found)
+        self.assertEqual(found["SPX"]["price"], 5870.12)
+
+    def test_nasdaq_100_is_its_own_symbol(self):
+        found = quotes("Nasdaq 100 closes at 21,012.40, up 1.2%")
+        self.assertNotIn("IXIC", found)
+        self.assertEqual(found["NDX"]["price"], 21012.40)
+
+
+class MarketDataTest(unittest.TestCase):
+    def payload(self, at: float, title: str):
+        return {"last_updated": at, "indices": [{"title": title, "url": "https://example.com"}]}
+
+    def test_implausible_jump_is_rejected(self):
+        market = MarketData(capacity=8, snapshot_path="")
+        market.ingest("crypto", self.payload(1, "Bitcoin trades at $67,000.00"))
+        market.ingest("crypto", self.payload(2, "Bitcoin trades at $5.00"))
+        market.ingest("crypto", self.payload(3, "Bitcoin trades at $67,500.00"))
+        _, prices = market.symbols["BTC"].points()
+        self.assertEqual(prices, [67000.0, 67500.0])
+        self.assertEqual(market.quotes_rejected, 1)
+
+    def test_history_follows_a_sustained_move(self):
+        market = MarketData(capacity=8, snapshot_path="")
+        market.ingest("crypto", self.payload(1, "Dogecoin at $0.10"))
+        for at in range(2, 5):
+            market.ingest("crypto", self.payload(at, "Dogecoin at $0.30"))
+        _, prices = market.symbols["DOGE"].points()
+        self.assertEqual(prices, [0.10, 0.30])
+
+    def test_ring_buffer_keeps_newest_points(self):
+        market = MarketData(capacity=3, snapshot_path="")
+        for at in range(1, 6):
+            market.ingest("us_markets", self.payload(at, f"S&P 500 at {5000 + at}.00"))
+        times, prices = market.symbols["SPX"].points()
+        self.assertEqual(times, [3.0, 4.0, 5.0])
+        self.assertEqual(prices, [5003.0, 5004.0, 5005.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
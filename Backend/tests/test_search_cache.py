@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_cache
+from search_cache import SearchCache, make_key
+
+
+def key(query: str, topic: str = "general"):
+    return make_key(query, topic, 5, False)
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_concurrent_threads_share_one_fetch(self):
+        cache = SearchCache()
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(2)
+            return {"results": ["a"]}
+
+        values = []
+        threads = [threading.Thread(target=lambda: values.append(cache.get(key("q"), fetch))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join(2)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(values, [{"results": ["a"]}] * 5)
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["shared"]), (1, 4))
+
+    def test_failure_reaches_every_waiter_and_is_not_cached(self):
+        cache = SearchCache()
+        calls = []
+
+        async def afetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            raise RuntimeError("upstream down")
+
+        async def run():
+            return await asyncio.gather(*(cache.aget(key("q"), afetch) for _ in range(3)), return_exceptions=True)
+
+        errors = asyncio.run(run())
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+        self.assertEqual(len(calls), 1)
+
+        self.assertEqual(cache.get(key("q"), lambda: {"results": ["b"]}), {"results": ["b"]})
+
+
+class AsyncSingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cache = SearchCache()
+        self.calls = 0
+
+    async def afetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"results": [self.calls]}
+
+    async def test_concurrent_coroutines_share_one_fetch(self):
+        values = await asyncio.gather(*(self.cache.aget(key("q"), self.afetch) for _ in range(5)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(values, [{"results": [1]}] * 5)
+
+    async def test_cancelled_leader_does_not_fail_waiters(self):
+        leader = asyncio.create_task(self.cache.aget(key("q"), self.afetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self.cache.aget(key("q"), self.afetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await waiter, {"results": [1]})
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(self.calls, 1)
+
+    async def test_timeout_bounds_only_its_own_caller(self):
+        impatient = asyncio.create_task(self.cache.aget(key("q"), self.afetch, timeout=0.01))
+        patient = asyncio.create_task(self.cache.aget(key("q"), self.afetch, timeout=1))
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await impatient
+        self.assertEqual(await patient, {"results": [1]})
+        self.assertEqual(self.calls, 1)
+
+    async def test_refresh_skips_the_stored_value(self):
+        self.assertEqual(await self.cache.aget(key("q"), self.afetch), {"results": [1]})
+        self.assertEqual(await self.cache.aget(key("q"), self.afetch), {"results": [1]})
+        self.assertEqual(await self.cache.aget(key("q"), self.afetch, refresh=True), {"results": [2]})
+        self.assertEqual(await self.cache.aget(key("q"), self.afetch), {"results": [2]})
+
+
+class ExpiryTest(unittest.TestCase):
+    def test_entries_expire_after_their_topic_ttl(self):
+        cache = SearchCache(ttls={"news": 60, "general": 900})
+        now = [1000.0]
+        with mock.patch.object(search_cache.time, "monotonic", lambda: now[0]):
+            cache.get(key("q", "news"), lambda: {"results": ["old"]})
+            cache.get(key("q", "general"), lambda: {"results": ["old"]})
+
+            now[0] += 61
+            self.assertEqual(cache.get(key("q", "news"), lambda: {"results": ["new"]}), {"results": ["new"]})
+            self.assertEqual(cache.get(key("q", "general"), lambda: {"results": ["new"]}), {"results": ["old"]})
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_least_recently_used_entry_is_evicted_past_max_entries(self):
+        cache = SearchCache(max_entries=2)
+        cache.get(key("a"), lambda: {"results": ["a"]})
+        cache.get(key("b"), lambda: {"results": ["b"]})
+        cache.get(key("a"), lambda: {"results": ["unused"]})  # a is now the most recent
+        cache.get(key("c"), lambda: {"results": ["c"]})
+
+        self.assertEqual(cache.get(key("a"), lambda: {"results": ["refetched"]}), {"results": ["a"]})
+        self.assertEqual(cache.get(key("b"), lambda: {"results": ["refetched"]}), {"results": ["refetched"]})
+        self.assertGreaterEqual(cache.stats()["evictions"], 1)
+
+    def test_byte_budget_evicts_oldest_entries(self):
+        cache = SearchCache(max_bytes=100)
+        cache.get(key("a"), lambda: {"results": ["x" * 40]})
+        cache.get(key("b"), lambda: {"results": ["y" * 40]})
+        cache.get(key("c"), lambda: {"results": ["z" * 40]})
+
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], 100)
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(cache.get(key("a"), lambda: {"results": ["refetched"]}), {"results": ["refetched"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
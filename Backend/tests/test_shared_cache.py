@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import asyncio
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_cache import SharedCache
+
+
+class SharedCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "shared.sqlite")
+        # Two instances stand in for two workers: separate connections and lease owners
+        self.a = SharedCache(self.path)
+        self.b = SharedCache(self.path)
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class LeaseTest(SharedCacheTestCase):
+    def test_only_one_owner_holds_a_lease(self):
+        self.assertTrue(self.a.claim("refresh", ttl=30))
+        self.assertFalse(self.b.claim("refresh", ttl=30))
+        # Re-claiming extends the owner's own lease
+        self.assertTrue(self.a.claim("refresh", ttl=30))
+
+    def test_expired_lease_is_taken_over(self):
+        self.assertTrue(self.a.claim("refresh", ttl=0.05))
+        time.sleep(0.1)
+        self.assertTrue(self.b.claim("refresh", ttl=30))
+        self.assertFalse(self.a.claim("refresh", ttl=30))
+
+    def test_release_frees_the_lease_for_others(self):
+        self.assertTrue(self.a.claim("refresh", ttl=30))
+        self.b.release("refresh")  # not the owner: no effect
+        self.assertFalse(self.b.claim("refresh", ttl=30))
+
+        self.a.release("refresh")
+        self.assertTrue(self.b.claim("refresh", ttl=30))
+
+    def test_leases_are_independent(self):
+        self.assertTrue(self.a.claim("finance:crypto", ttl=30))
+        self.assertTrue(self.b.claim("finance:earnings", ttl=30))
+
+    def test_async_variants_run_on_the_writer_thread(self):
+        async def run():
+            claimed = await self.a.aclaim("refresh", ttl=30)
+            await self.a.aset("ns", "k", {"v": 1})
+            await self.a.arelease("refresh")
+            return claimed
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(self.b.get("ns", "k"), {"v": 1})
+        self.assertTrue(self.b.claim("refresh", ttl=30))
+
+
+class StoreTest(SharedCacheTestCase):
+    def test_other_workers_writes_are_seen(self):
+        self.a.set("ns", "k", {"v": 1})
+        self.assertEqual(self.b.get("ns", "k"), {"v": 1})
+        self.assertEqual(self.b.get("ns", "k"), {"v": 1})
+        self.assertEqual(self.b.memo_hits, 1)
+
+        self.a.set("ns", "k", {"v": 2})
+        self.assertEqual(self.b.get("ns", "k"), {"v": 2})
+
+    def test_reads_do_not_wait_on_a_blocked_write(self):
+        self.a.set("ns", "k", {"v": 1})
+        other = sqlite3.connect(self.path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("INSERT INTO leases VALUES ('held', 'other', 0)")
+
+        async def run():
+            write = asyncio.create_task(self.a.aset("ns", "k2", {"v": 2}))
+            await asyncio.sleep(0.1)
+            started = time.perf_counter()
+            value = self.a.get("ns", "k")
+            waited = time.perf_counter() - started
+            other.execute("COMMIT")
+            await write
+            return value, waited
+
+        try:
+            value, waited = asyncio.run(run())
+        finally:
+            other.close()
+        self.assertEqual(value, {"v": 1})
+        self.assertLess(waited, 1)
+        self.assertEqual(self.a.get("ns", "k2"), {"v": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
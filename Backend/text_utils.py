@@ -0,0 +1,28 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Words ignored when comparing queries and scoring text
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "of", "in", "on", "for", "to", "and",
+    "or", "what", "who", "whom", "which", "when", "where", "why", "how", "does", "do",
+    "did", "can", "could", "tell", "me", "about", "please", "i", "you", "it",
+}
+
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref"}
+
+
+def canonical_url(url: str) -> str:
+    """Normalizes a URL so the same article from different queries dedupes."""
+    try:
+        parts = urlsplit(url.strip())
+    except (AttributeError, ValueError):
+        return url
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PREFIXES) and k.lower() not in TRACKING_PARAMS
+    ])
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme, host, path, query, ""))
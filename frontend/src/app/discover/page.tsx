@@ -32,8 +32,8 @@ export default function DiscoverPage() {
             else setIsRefreshing(true);
 
             try {
-                // Add timestamp to prevent caching
-                const res = await fetch(`http://localhost:8000/api/discover?category=${activeTab}&t=${new Date().getTime()}`);
+                // Stable URL so the browser revalidates with If-None-Match and reuses its copy on a 304
+                const res = await fetch(`http://localhost:8000/api/discover?category=${activeTab}`);
                 const json = await res.json();
                 setData(json);
                 if (json.last_updated) {
@@ -52,25 +52,19 @@ export default function DiscoverPage() {
         // Initial fetch
         fetchData();
 
-        // Auto-refresh every 60 seconds
-        const intervalId = setInterval(() => {
-            if (document.visibilityState === 'visible') {
-                fetchData(true);
-            }
-        }, 60000);
-
-        // Refresh when tab becomes visible if it was backgrounded
-        const handleVisibilityChange = () => {
-            if (document.visibilityState === 'visible') {
-                fetchData(true);
-            }
+        // The backend pushes new content for this category as soon as it is refreshed
+        const source = new EventSource(`http://localhost:8000/api/discover/stream?categories=${activeTab}&mode=full&snapshot=false`);
+        const applyUpdate = (event: MessageEvent) => {
+            const json = JSON.parse(event.data);
+            setData(json);
+            setLastUpdated(json.last_updated ? new Date(json.last_updated * 1000) : new Date());
         };
-
-        document.addEventListener('visibilitychange', handleVisibilityChange);
+        source.addEventListener('update', applyUpdate);
+        // Sent instead of updates when this tab fell too far behind
+        source.addEventListener('snapshot', applyUpdate);
 
         return () => {
-            clearInterval(intervalId);
-            document.removeEventListener('visibilitychange', handleVisibilityChange);
+            source.close();
         };
     }, [activeTab]);
 